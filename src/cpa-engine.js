@@ -1,6 +1,21 @@
+const crypto = require('crypto');
+const http = require('http');
+const https = require('https');
 const axios = require('axios');
 const Redis = require('redis');
 const promClient = require('prom-client');
+const {
+    RULE_DEPOSIT,
+    RULE_BETS,
+    RULE_GGR,
+    RULE_PERIOD,
+    RULE_FRAUD,
+    DAY_MS,
+    periodCutoff,
+    newAccountCutoff,
+    evaluateLead,
+    evaluateBatch
+} = require('./cpa-kernel');
 
 // Métricas Prometheus
 const cpaValidationCounter = new promClient.Counter({
@@ -16,21 +31,443 @@ const cpaValidationDuration = new promClient.Histogram({
     buckets: [0.1, 0.5, 1, 2, 5, 10]
 });
 
+const cpaBatchValidationDuration = new promClient.Histogram({
+    name: 'cpa_batch_validation_duration_seconds',
+    help: 'Duration of batch CPA validations in seconds',
+    labelNames: ['option'],
+    buckets: [0.01, 0.05, 0.1, 0.5, 1, 5]
+});
+
 const configCacheHits = new promClient.Counter({
     name: 'config_cache_hits_total',
     help: 'Total number of config cache hits',
     labelNames: ['key', 'hit_type']
 });
 
+const validationCacheHits = new promClient.Counter({
+    name: 'cpa_validation_cache_hits_total',
+    help: 'Total number of CPA validation result cache lookups',
+    labelNames: ['hit_type']
+});
+
+const configServiceRequestDuration = new promClient.Histogram({
+    name: 'config_service_request_duration_seconds',
+    help: 'Duration of config-service HTTP requests in seconds',
+    labelNames: ['endpoint', 'status'],
+    buckets: [0.005, 0.01, 0.05, 0.1, 0.5, 1, 5]
+});
+
+const configServiceErrors = new promClient.Counter({
+    name: 'config_service_errors_total',
+    help: 'Total number of failed config-service HTTP requests',
+    labelNames: ['endpoint', 'type']
+});
+
+// Logs detalhados por validação (configurações e cada regra) só com LOG_LEVEL=debug
+const DEBUG_LOGS = process.env.LOG_LEVEL === 'debug';
+
+// Valores de resultado compartilhados por todas as validações
+const RESULT_APPROVED = 'approved';
+const RESULT_REJECTED = 'rejected';
+const RESULT_ERROR = 'error';
+const RULE_STATUS_APPROVED = 'APROVADO';
+const RULE_STATUS_REJECTED = 'REJEITADO';
+const REASON_APPROVED = 'Todas as validações aprovadas';
+const REASON_REJECTED = 'Uma ou mais validações falharam';
+
+// Pool de conexões keep-alive compartilhado por todos os clientes do config-service
+const CONFIG_SERVICE_MAX_SOCKETS = parseInt(process.env.CONFIG_SERVICE_MAX_SOCKETS) || 64;
+const configServiceHttpAgent = new http.Agent({
+    keepAlive: true,
+    maxSockets: CONFIG_SERVICE_MAX_SOCKETS,
+    maxFreeSockets: Math.ceil(CONFIG_SERVICE_MAX_SOCKETS / 2)
+});
+const configServiceHttpsAgent = new https.Agent({
+    keepAlive: true,
+    maxSockets: CONFIG_SERVICE_MAX_SOCKETS,
+    maxFreeSockets: Math.ceil(CONFIG_SERVICE_MAX_SOCKETS / 2)
+});
+
+const RETRYABLE_STATUS = [502, 503, 504];
+const RETRYABLE_CODES = ['ECONNRESET', 'ECONNREFUSED', 'EPIPE'];
+const MAX_RETRIES = 3;
+const RETRY_BACKOFF_MS = 200;
+
+// Circuit breaker: após N falhas seguidas (5xx, timeout ou erro de rede) as
+// chamadas ao config-service falham imediatamente durante o intervalo de
+// reabertura, em vez de cada requisição esperar o timeout. Passado o
+// intervalo, uma única chamada testa o serviço (half-open) enquanto as demais
+// continuam falhando na hora; o resultado dela fecha ou reabre o circuito.
+const BREAKER_FAILURE_THRESHOLD = parseInt(process.env.CONFIG_SERVICE_BREAKER_THRESHOLD) || 5;
+const BREAKER_RESET_MS = parseInt(process.env.CONFIG_SERVICE_BREAKER_RESET_MS) || 30000;
+
+// Respostas do endpoint em lote que indicam que ele não existe neste config-service
+const BULK_UNAVAILABLE_STATUS = [404, 405, 501];
+
+// Rótulo de métrica por tipo de chamada (sem a chave, para não explodir a cardinalidade)
+function configServiceEndpoint(url = '') {
+    if (url === '/health') {
+        return 'health';
+    }
+    return url.endsWith('/bulk') ? 'bulk' : 'configuration';
+}
+
+function configServiceErrorType(error) {
+    if (error.response) {
+        return error.response.status >= 500 ? 'http_5xx' : 'http_4xx';
+    }
+    return error.code === 'ECONNABORTED' || error.code === 'ETIMEDOUT' ? 'timeout' : 'network';
+}
+
+// Cliente HTTP do config-service com conexões persistentes e retry com backoff
+// exponencial. Todas as chamadas ao config-service são leituras, logo seguras
+// para repetir.
+function createConfigServiceClient(baseURL) {
+    const client = axios.create({
+        baseURL,
+        timeout: 5000,
+        httpAgent: configServiceHttpAgent,
+        httpsAgent: configServiceHttpsAgent
+    });
+
+    // openUntil = 0: fechado; no futuro: aberto; no passado: half-open
+    const breaker = { failures: 0, openUntil: 0, probing: false };
+
+    const closeBreaker = () => {
+        breaker.failures = 0;
+        breaker.openUntil = 0;
+        breaker.probing = false;
+    };
+
+    client.interceptors.request.use((config) => {
+        if (breaker.openUntil !== 0) {
+            if (Date.now() < breaker.openUntil || breaker.probing) {
+                configServiceErrors.inc({ endpoint: configServiceEndpoint(config.url), type: 'circuit_open' });
+                const error = new Error('Circuit breaker do config-service aberto');
+                error.code = 'ECIRCUITOPEN';
+                throw error;
+            }
+            breaker.probing = true;
+        }
+        // Retries reaproveitam o config: a marca de sonda vale só para esta tentativa
+        config.breakerProbe = breaker.probing;
+        config.requestStartTime = Date.now();
+        return config;
+    });
+
+    // Métricas de cada tentativa e estado do circuit breaker; registrado antes
+    // do retry para ver cada tentativa individualmente
+    client.interceptors.response.use((response) => {
+        const { config } = response;
+        configServiceRequestDuration.observe(
+            { endpoint: configServiceEndpoint(config.url), status: response.status },
+            (Date.now() - config.requestStartTime) / 1000
+        );
+        closeBreaker();
+        return response;
+    }, (error) => {
+        const config = error.config;
+        if (!config || error.code === 'ECIRCUITOPEN') {
+            throw error;
+        }
+
+        const endpoint = configServiceEndpoint(config.url);
+        const type = configServiceErrorType(error);
+        configServiceRequestDuration.observe(
+            { endpoint, status: error.response ? error.response.status : 'error' },
+            (Date.now() - config.requestStartTime) / 1000
+        );
+        configServiceErrors.inc({ endpoint, type });
+
+        // 4xx (ex.: 404 do endpoint em lote) indica que o serviço respondeu
+        if (type === 'http_4xx') {
+            closeBreaker();
+            throw error;
+        }
+
+        breaker.failures++;
+        if (config.breakerProbe || (breaker.openUntil === 0 && breaker.failures >= BREAKER_FAILURE_THRESHOLD)) {
+            console.warn(`Circuit breaker do config-service aberto por ${BREAKER_RESET_MS}ms após ${breaker.failures} falhas seguidas`);
+            breaker.openUntil = Date.now() + BREAKER_RESET_MS;
+            breaker.probing = false;
+        }
+        throw error;
+    });
+
+    client.interceptors.response.use(null, async (error) => {
+        const config = error.config;
+        const retryable = error.response
+            ? RETRYABLE_STATUS.includes(error.response.status)
+            : RETRYABLE_CODES.includes(error.code);
+
+        if (!config || !retryable || (config.retryCount || 0) >= MAX_RETRIES) {
+            throw error;
+        }
+
+        config.retryCount = (config.retryCount || 0) + 1;
+        await new Promise(resolve => setTimeout(resolve, RETRY_BACKOFF_MS * 2 ** (config.retryCount - 1)));
+        return client(config);
+    });
+
+    return client;
+}
+
+// Estado de configuração por URL do config-service, compartilhado entre instâncias
+const sharedConfigStates = new Map();
+
+function getSharedConfigState(configServiceUrl) {
+    let state = sharedConfigStates.get(configServiceUrl);
+    if (!state) {
+        state = {
+            httpClient: createConfigServiceClient(configServiceUrl),
+            cache: new Map(),
+            refreshing: new Set(),
+            // Incrementada sempre que o valor de alguma configuração muda
+            version: 0
+        };
+        sharedConfigStates.set(configServiceUrl, state);
+    }
+    return state;
+}
+
+// Converter o valor de uma configuração do config-service para o tipo declarado
+function convertConfigValue(config) {
+    let value = config.value;
+    
+    switch (config.data_type) {
+        case 'float':
+            value = parseFloat(value);
+            break;
+        case 'int':
+            value = parseInt(value);
+            break;
+        case 'bool':
+            value = value.toLowerCase() === 'true';
+            break;
+        case 'json':
+            value = JSON.parse(value);
+            break;
+    }
+    
+    return value;
+}
+
+// Strings também são gravadas como JSON para que a leitura do Redis as
+// recupere com um único JSON.parse, sem cair no caminho de exceção abaixo.
+// Números e booleanos mantêm String() para preservar NaN/Infinity.
+function serializeConfigValue(value) {
+    return typeof value === 'string' || typeof value === 'object' ? JSON.stringify(value) : String(value);
+}
+
+// Entradas gravadas antes da serialização JSON de strings continuam legíveis
+// pelo fallback para o valor bruto
+function parseCachedConfigValue(redisCached) {
+    try {
+        return JSON.parse(redisCached);
+    } catch {
+        return redisCached;
+    }
+}
+
+// Chaves de configuração usadas pelas regras de uma opção de validação
+function ruleConfigKeys(validationOption) {
+    return Object.freeze([
+        `cpa.validacao.${validationOption}.deposito_minimo`,
+        `cpa.validacao.${validationOption}.numero_apostas`,
+        `cpa.validacao.${validationOption}.ggr_minimo`,
+        'cpa.validacao.prazo_dias',
+        'cpa.validacao.timezone',
+        'cpa.validacao.deteccao_fraude_ativa'
+    ]);
+}
+
+// Listas precomputadas para as opções conhecidas, evitando montar as chaves a
+// cada validação
+const RULE_CONFIG_KEYS = new Map([
+    ['opcao1', ruleConfigKeys('opcao1')],
+    ['opcao2', ruleConfigKeys('opcao2')]
+]);
+
+// Limites numéricos das regras a partir das configurações. Regras não
+// configuradas recebem limites que sempre aprovam no kernel.
+function compileRuleLimits(configs, validationOption) {
+    const [depositKey, betsKey, ggrKey, daysKey, , fraudKey] =
+        RULE_CONFIG_KEYS.get(validationOption) || ruleConfigKeys(validationOption);
+    const minDeposit = configs[depositKey];
+    const minBets = configs[betsKey];
+    const minGGR = configs[ggrKey];
+    const maxDays = configs[daysKey];
+
+    return {
+        minDeposit,
+        minBets,
+        minGGR,
+        maxDays,
+        depositLimit: minDeposit === null ? -Infinity : minDeposit,
+        betsLimit: minBets === null ? -Infinity : minBets,
+        ggrLimit: minGGR === null ? -Infinity : minGGR,
+        daysLimit: maxDays === null ? Infinity : maxDays,
+        checkFraud: Boolean(configs[fraudKey])
+    };
+}
+
+// Indica se limites já compilados correspondem aos valores atuais das
+// configurações (Object.is para que NaN também seja considerado igual)
+function ruleLimitsMatch(limits, configs, validationOption) {
+    const [depositKey, betsKey, ggrKey, daysKey, , fraudKey] =
+        RULE_CONFIG_KEYS.get(validationOption) || ruleConfigKeys(validationOption);
+    return Object.is(limits.minDeposit, configs[depositKey]) &&
+        Object.is(limits.minBets, configs[betsKey]) &&
+        Object.is(limits.minGGR, configs[ggrKey]) &&
+        Object.is(limits.maxDays, configs[daysKey]) &&
+        limits.checkFraud === Boolean(configs[fraudKey]);
+}
+
+// Timestamp (ms) da data de cadastro. Strings ISO são convertidas com
+// Date.parse, que dá o mesmo resultado de new Date(...).getTime() sem alocar
+// um Date por lead; timestamps numéricos seguem pelo construtor.
+function parseRegistrationTime(registrationDate) {
+    return typeof registrationDate === 'string'
+        ? Date.parse(registrationDate)
+        : new Date(registrationDate).getTime();
+}
+
+// Lote de leads em layout colunar (SoA): um array tipado contíguo por campo
+// numérico, mais a referência às requisições originais para ids e diagnósticos
+class LeadBatch {
+    constructor(leads, { deposits, bets, ggr, registrationTimes }) {
+        this.leads = leads;
+        this.size = leads.length;
+        this.deposits = deposits;
+        this.bets = bets;
+        this.ggr = ggr;
+        this.registrationTimes = registrationTimes;
+    }
+
+    // Converte a lista de requisições numa única passada; as colunas podem vir
+    // de buffers reaproveitados (ver getBatchColumns). Timestamps de cadastro
+    // já convertidos por quem validou o lote são copiados sem novo parse.
+    static fromRequests(requests, columns, registrationTimes = null) {
+        const batch = new LeadBatch(requests, columns);
+        for (let i = 0; i < batch.size; i++) {
+            const lead = requests[i];
+            batch.deposits[i] = lead.depositAmount;
+            batch.bets[i] = lead.betCount;
+            batch.ggr[i] = lead.ggrAmount;
+            batch.registrationTimes[i] = registrationTimes !== null
+                ? registrationTimes[i]
+                : parseRegistrationTime(lead.registrationDate);
+        }
+        return batch;
+    }
+}
+
+// Resultado de um lead no lote. Todos os campos são inicializados no construtor
+// para que todas as instâncias compartilhem a mesma hidden class no V8;
+// reason/failedRules ficam null quando o lead é aprovado e individualResults
+// só é preenchido no modo verbose.
+class BatchLeadResult {
+    constructor(validationId, affiliateId, userId, result, reason = null, failedRules = null, individualResults = null) {
+        this.validationId = validationId;
+        this.affiliateId = affiliateId;
+        this.userId = userId;
+        this.result = result;
+        this.reason = reason;
+        this.failedRules = failedRules;
+        this.individualResults = individualResults;
+    }
+}
+
+// Identificadores das regras, na ordem dos bits do kernel
+const RULE_NAMES = [
+    [RULE_DEPOSIT, 'deposito_minimo'],
+    [RULE_BETS, 'numero_apostas'],
+    [RULE_GGR, 'ggr_minimo'],
+    [RULE_PERIOD, 'prazo_dias'],
+    [RULE_FRAUD, 'deteccao_fraude']
+];
+
+// Listas de regras reprovadas precomputadas para cada máscara possível: leads
+// com as mesmas falhas compartilham o mesmo array congelado em vez de alocar um
+// novo por resultado
+const FAILED_RULE_NAMES = Array.from({ length: 1 << RULE_NAMES.length }, (_, mask) =>
+    Object.freeze(RULE_NAMES.filter(([bit]) => mask & bit).map(([, name]) => name))
+);
+
+function failedRuleNames(mask) {
+    return FAILED_RULE_NAMES[mask];
+}
+
+// Trechos JSON constantes de BatchLeadResult: tudo após userId é igual para
+// todos os aprovados e, nos rejeitados sem detalhes, depende só da lista de
+// regras reprovadas (um dos arrays compartilhados acima)
+const BATCH_RESULT_TAIL_APPROVED =
+    `,"result":${JSON.stringify(RESULT_APPROVED)},"reason":null,"failedRules":null,"individualResults":null}`;
+const BATCH_RESULT_TAILS_REJECTED = new Map(FAILED_RULE_NAMES.map(names => [
+    names,
+    `,"result":${JSON.stringify(RESULT_REJECTED)},"reason":${JSON.stringify(REASON_REJECTED)},"failedRules":${JSON.stringify(names)},"individualResults":null}`
+]));
+
+function batchResultTail(result) {
+    if (result.individualResults !== null || result.affiliateId === undefined || result.userId === undefined) {
+        return null;
+    }
+    if (result.failedRules === null) {
+        return result.result === RESULT_APPROVED && result.reason === null ? BATCH_RESULT_TAIL_APPROVED : null;
+    }
+    return result.result === RESULT_REJECTED && result.reason === REASON_REJECTED
+        ? BATCH_RESULT_TAILS_REJECTED.get(result.failedRules) || null
+        : null;
+}
+
+// Serializa results[start, end) como elementos de um array JSON (sem os
+// colchetes). Só os três identificadores são serializados por lead; o resto
+// vem dos trechos precomputados. Resultados fora do formato padrão (ex.:
+// verbose) usam JSON.stringify, com saída idêntica.
+function serializeBatchResults(results, start, end) {
+    let json = '';
+    for (let i = start; i < end; i++) {
+        const result = results[i];
+        const tail = batchResultTail(result);
+        if (i > start) {
+            json += ',';
+        }
+        json += tail === null
+            ? JSON.stringify(result)
+            : `{"validationId":${JSON.stringify(result.validationId)},"affiliateId":${JSON.stringify(result.affiliateId)},"userId":${JSON.stringify(result.userId)}${tail}`;
+    }
+    return json;
+}
+
 class CPARulesEngine {
     constructor() {
         this.configServiceUrl = process.env.CONFIG_SERVICE_URL || 
             'http://config-service.fature.svc.cluster.local:5000';
+        // Cliente HTTP e cache local são compartilhados entre instâncias que usam
+        // o mesmo config-service
+        const sharedState = getSharedConfigState(this.configServiceUrl);
+        this.httpClient = sharedState.httpClient;
         this.redisUrl = process.env.REDIS_URL || 
             'redis://redis.fature.svc.cluster.local:6379';
         this.redisClient = null;
-        this.cache = new Map();
+        this.cache = sharedState.cache;
         this.cacheTTL = parseInt(process.env.CACHE_TTL) || 300000; // 5 minutos
+        this.cacheHardTTL = parseInt(process.env.CACHE_HARD_TTL) || this.cacheTTL * 3;
+        this.refreshing = sharedState.refreshing;
+        this.configState = sharedState;
+        this.bulkConfigUnavailableUntil = 0;
+        this.validationCacheTTL = parseInt(process.env.VALIDATION_CACHE_TTL) || 60; // segundos
+        this.validationCacheBatchSize = parseInt(process.env.VALIDATION_CACHE_BATCH_SIZE) || 100;
+        this.validationCacheBuffer = [];
+        this.validationCacheFlushTimer = null;
+        this.validationMemo = new Map();
+        this.validationMemoSize = parseInt(process.env.VALIDATION_MEMO_SIZE) || 10000;
+        this.batchColumns = null;
+        this.batchYieldSize = parseInt(process.env.CPA_BATCH_YIELD_SIZE) || 1000;
+        this.ruleLimits = new Map();
+        this.healthCheckTTL = parseInt(process.env.HEALTH_CHECK_TTL) || 1000;
+        this.healthCache = null;
+        this.healthCheckInFlight = null;
         this.initialized = false;
     }
 
@@ -73,95 +510,391 @@ class CPARulesEngine {
         }
     }
 
-    async getConfiguration(key) {
+    // Executa o kernel de avaliação com leads sintéticos para que o V8 já o tenha
+    // otimizado (TurboFan) antes da primeira requisição real
+    warmup(iterations = parseInt(process.env.CPA_WARMUP_ITERATIONS) || 10000) {
         const startTime = Date.now();
+        const registeredAfter = periodCutoff(startTime, 30);
+        const newAccountAfter = newAccountCutoff(startTime);
+        let rejected = 0;
+
+        for (let i = 0; i < iterations; i++) {
+            const registrationTime = startTime - ((i % 50) - 1) * DAY_MS;
+            const failed = evaluateLead(i % 2500, i % 80, (i % 1400) - 800, registrationTime, 30, 10, 20, registeredAfter, newAccountAfter, true);
+            if (failed !== 0) {
+                rejected++;
+            }
+        }
+
+        console.log(`✓ Kernel de validação CPA aquecido: ${iterations} avaliações em ${Date.now() - startTime}ms`);
+        return rejected;
+    }
+
+    async getConfiguration(key) {
+        const configs = await this.getConfigurations([key]);
+        return configs[key];
+    }
+
+    async fetchConfiguration(key) {
+        // Requisição condicional: se o config-service responder 304 o valor já
+        // em cache é reaproveitado sem transferir nem converter o corpo
+        const cached = this.cache.get(key);
+        const etag = cached ? cached.etag : null;
+        const response = await this.httpClient.get(`/api/v1/configurations/${key}`, {
+            headers: etag ? { 'If-None-Match': etag } : undefined,
+            validateStatus: status => (status >= 200 && status < 300) || status === 304
+        });
+
+        if (response.status === 304) {
+            await this.storeConfigurations([[key, cached.value, etag]]);
+            configCacheHits.inc({ key, hit_type: 'not_modified' });
+            return cached.value;
+        }
         
-        try {
-            // Verificar cache local primeiro
+        if (response.data.success) {
+            const value = convertConfigValue(response.data.data);
+            await this.storeConfigurations([[key, value, response.headers.etag || null]]);
+            configCacheHits.inc({ key, hit_type: 'config_service' });
+            return value;
+        }
+
+        return null;
+    }
+
+    // Busca várias configurações resolvendo cada camada em lote: cache local,
+    // um único MGET no Redis e uma única requisição ao config-service
+    async getConfigurations(keys) {
+        const values = new Map();
+        const pending = [];
+        const stale = [];
+
+        // Verificar cache local primeiro. Entradas vencidas (mas dentro do TTL
+        // máximo) são servidas imediatamente e atualizadas em segundo plano.
+        const now = Date.now();
+        for (const key of keys) {
             const localCached = this.cache.get(key);
-            if (localCached && Date.now() - localCached.timestamp < this.cacheTTL) {
+            const age = localCached ? now - localCached.timestamp : Infinity;
+            if (age < this.cacheTTL) {
                 configCacheHits.inc({ key, hit_type: 'local' });
-                return localCached.value;
+                values.set(key, localCached.value);
+            } else if (age < this.cacheHardTTL) {
+                configCacheHits.inc({ key, hit_type: 'stale' });
+                values.set(key, localCached.value);
+                stale.push(key);
+            } else {
+                pending.push(key);
             }
+        }
 
-            // Verificar cache Redis
-            if (this.redisClient && this.redisClient.isOpen) {
-                try {
-                    const redisCached = await this.redisClient.get(`config_cache:${key}`);
-                    if (redisCached) {
-                        let value;
-                        try {
-                            value = JSON.parse(redisCached);
-                        } catch {
-                            value = redisCached;
-                        }
-                        
-                        // Atualizar cache local
-                        this.cache.set(key, {
-                            value: value,
-                            timestamp: Date.now()
-                        });
-                        
-                        configCacheHits.inc({ key, hit_type: 'redis' });
-                        return value;
-                    }
-                } catch (redisError) {
-                    console.warn(`Redis cache miss for ${key}:`, redisError.message);
-                }
+        if (stale.length > 0) {
+            this.refreshInBackground(stale);
+        }
+
+        if (pending.length > 0) {
+            const loaded = await this.loadConfigurations(pending);
+            for (const [key, value] of loaded) {
+                values.set(key, value);
             }
+        }
 
-            // Buscar do config-service
-            const response = await axios.get(
-                `${this.configServiceUrl}/api/v1/configurations/${key}`,
-                { timeout: 5000 }
-            );
-            
-            if (response.data.success) {
-                const config = response.data.data;
-                let value = config.value;
-                
-                // Converter tipo de dados
-                switch (config.data_type) {
-                    case 'float':
-                        value = parseFloat(value);
-                        break;
-                    case 'int':
-                        value = parseInt(value);
-                        break;
-                    case 'bool':
-                        value = value.toLowerCase() === 'true';
-                        break;
-                    case 'json':
-                        value = JSON.parse(value);
-                        break;
-                }
-                
-                // Armazenar nos caches
-                this.cache.set(key, {
-                    value: value,
-                    timestamp: Date.now()
+        const configs = {};
+        for (const key of keys) {
+            configs[key] = values.has(key) ? values.get(key) : null;
+        }
+        return configs;
+    }
+
+    // Atualiza chaves vencidas sem bloquear quem pediu; cada chave tem no
+    // máximo uma atualização em andamento
+    refreshInBackground(keys) {
+        const keysToRefresh = keys.filter(key => !this.refreshing.has(key));
+        if (keysToRefresh.length === 0) {
+            return;
+        }
+
+        keysToRefresh.forEach(key => this.refreshing.add(key));
+        this.loadConfigurations(keysToRefresh)
+            .catch(error => console.warn(`Falha ao atualizar configurações ${keysToRefresh.join(', ')}:`, error.message))
+            .finally(() => keysToRefresh.forEach(key => this.refreshing.delete(key)));
+    }
+
+    // Resolve chaves fora do cache local: Redis e depois config-service
+    async loadConfigurations(keys) {
+        const values = new Map();
+        let pending = keys;
+
+        // Verificar cache Redis com todas as chaves de uma vez
+        if (this.redisClient && this.redisClient.isOpen) {
+            try {
+                const redisCached = await this.redisClient.mGet(pending.map(key => `config_cache:${key}`));
+                const missing = [];
+                pending.forEach((key, index) => {
+                    if (!redisCached[index]) {
+                        missing.push(key);
+                        return;
+                    }
+                    const value = parseCachedConfigValue(redisCached[index]);
+                    // O ETag continua válido enquanto o valor no Redis for o mesmo
+                    const previous = this.cache.get(key);
+                    this.setCachedConfiguration(
+                        key,
+                        value,
+                        Date.now(),
+                        previous && previous.etag && serializeConfigValue(previous.value) === redisCached[index]
+                            ? previous.etag
+                            : null
+                    );
+                    configCacheHits.inc({ key, hit_type: 'redis' });
+                    values.set(key, value);
                 });
+                pending = missing;
+            } catch (redisError) {
+                console.warn(`Redis cache miss for ${pending.join(', ')}:`, redisError.message);
+            }
+        }
 
-                if (this.redisClient && this.redisClient.isOpen) {
+        // Buscar o restante do config-service
+        if (pending.length > 0) {
+            const fetched = await this.fetchConfigurationsBulk(pending);
+            if (fetched) {
+                for (const key of pending) {
+                    values.set(key, fetched.has(key) ? fetched.get(key) : null);
+                }
+            } else {
+                // config-service sem busca em lote: buscas individuais em paralelo,
+                // cada falha resulta em null sem afetar as demais chaves
+                const results = await Promise.all(pending.map(async (key) => {
                     try {
-                        const cacheValue = typeof value === 'object' ? JSON.stringify(value) : String(value);
-                        await this.redisClient.setEx(`config_cache:${key}`, 3600, cacheValue);
-                    } catch (redisError) {
-                        console.warn(`Failed to cache ${key} in Redis:`, redisError.message);
+                        return await this.fetchConfiguration(key);
+                    } catch (error) {
+                        console.error(`Erro ao buscar configuração ${key}:`, error.message);
+                        configCacheHits.inc({ key, hit_type: 'error' });
+                        return null;
                     }
-                }
-                
-                configCacheHits.inc({ key, hit_type: 'config_service' });
-                return value;
+                }));
+                pending.forEach((key, index) => values.set(key, results[index]));
             }
+        }
+
+        return values;
+    }
+
+    // Retorna um Map chave -> valor, ou null quando a busca em lote não está
+    // disponível ou falhou; nesse caso quem chama recorre às buscas individuais
+    // em vez de tratar todas as chaves como ausentes (o que desativaria as regras)
+    async fetchConfigurationsBulk(keys) {
+        if (Date.now() < this.bulkConfigUnavailableUntil) {
+            return null;
+        }
+
+        let response;
+        try {
+            response = await this.httpClient.post('/api/v1/configurations/bulk', { keys });
         } catch (error) {
-            console.error(`Erro ao buscar configuração ${key}:`, error.message);
-            configCacheHits.inc({ key, hit_type: 'error' });
+            if (error.response && BULK_UNAVAILABLE_STATUS.includes(error.response.status)) {
+                this.markBulkConfigUnavailable(`status ${error.response.status}`);
+            } else {
+                console.warn('Erro na busca em lote de configurações, usando buscas individuais:', error.message);
+            }
+            return null;
         }
-        
+
+        const body = response.data;
+        if (!body || body.success !== true || !Array.isArray(body.data)) {
+            this.markBulkConfigUnavailable('resposta em formato inesperado');
+            return null;
+        }
+
+        // Um valor inválido afeta só a própria chave, como nas buscas individuais
+        const fetched = new Map();
+        for (const config of body.data) {
+            try {
+                fetched.set(config.key, convertConfigValue(config));
+            } catch (error) {
+                console.error(`Erro ao converter configuração ${config && config.key}:`, error.message);
+            }
+        }
+        await this.storeConfigurations([...fetched]);
+
+        for (const key of keys) {
+            configCacheHits.inc({ key, hit_type: fetched.has(key) ? 'config_service' : 'error' });
+        }
+        return fetched;
+    }
+
+    // Reavaliar a disponibilidade do endpoint em lote apenas após o TTL do cache
+    markBulkConfigUnavailable(reason) {
+        console.warn(`config-service sem busca de configurações em lote (${reason}), usando buscas individuais`);
+        this.bulkConfigUnavailableUntil = Date.now() + this.cacheTTL;
+    }
+
+    // Atualiza o cache local, avançando a versão das configurações quando o
+    // valor de fato muda
+    setCachedConfiguration(key, value, timestamp, etag = null) {
+        const previous = this.cache.get(key);
+        if (!previous || serializeConfigValue(previous.value) !== serializeConfigValue(value)) {
+            this.configState.version++;
+        }
+        this.cache.set(key, { value, timestamp, etag });
+    }
+
+    async storeConfigurations(entries) {
+        // Armazenar nos caches
+        const timestamp = Date.now();
+        for (const [key, value, etag = null] of entries) {
+            this.setCachedConfiguration(key, value, timestamp, etag);
+        }
+
+        if (entries.length === 0 || !this.redisClient || !this.redisClient.isOpen) {
+            return;
+        }
+
+        try {
+            const transaction = this.redisClient.multi();
+            for (const [key, value] of entries) {
+                transaction.setEx(`config_cache:${key}`, 3600, serializeConfigValue(value));
+            }
+            await transaction.exec();
+        } catch (redisError) {
+            console.warn(`Failed to cache ${entries.map(([key]) => key).join(', ')} in Redis:`, redisError.message);
+        }
+    }
+
+    async getRuleConfigs(validationOption = 'opcao1') {
+        return this.getConfigurations(RULE_CONFIG_KEYS.get(validationOption) || ruleConfigKeys(validationOption));
+    }
+
+    // Limites compilados por opção, reaproveitados enquanto as configurações
+    // não mudarem; só recompila após uma atualização de valor
+    getRuleLimits(configs, validationOption) {
+        const cached = this.ruleLimits.get(validationOption);
+        if (cached && ruleLimitsMatch(cached, configs, validationOption)) {
+            return cached;
+        }
+
+        const limits = Object.freeze(compileRuleLimits(configs, validationOption));
+        if (RULE_CONFIG_KEYS.has(validationOption)) {
+            this.ruleLimits.set(validationOption, limits);
+        }
+        return limits;
+    }
+
+    getValidationFingerprint(request, validationOption) {
+        const { affiliateId, userId, depositAmount, betCount, ggrAmount, registrationDate } = request;
+        return `${validationOption}:${affiliateId}:${userId}:${depositAmount}:${betCount}:${ggrAmount}:${registrationDate}`;
+    }
+
+    // A chave do Redis inclui os valores das configurações usadas: resultados
+    // calculados com configurações anteriores deixam de ser encontrados assim
+    // que alguma delas muda, em qualquer processo
+    getValidationCacheKey(fingerprint, configs) {
+        return `cpa_validation:${crypto.createHash('sha1').update(`${fingerprint}:${JSON.stringify(configs)}`).digest('hex')}`;
+    }
+
+    // Memória local (LRU com TTL) na frente do Redis. A chave inclui a versão
+    // das configurações, então qualquer mudança de configuração invalida as
+    // entradas anteriores, que saem por LRU ou TTL.
+    getMemoizedValidation(memoKey) {
+        const entry = this.validationMemo.get(memoKey);
+        if (!entry) {
+            return null;
+        }
+
+        this.validationMemo.delete(memoKey);
+        if (entry.expiresAt <= Date.now()) {
+            return null;
+        }
+
+        this.validationMemo.set(memoKey, entry);
+        validationCacheHits.inc({ hit_type: 'memory' });
+        return entry.response;
+    }
+
+    memoizeValidation(memoKey, response) {
+        if (this.validationMemo.size >= this.validationMemoSize) {
+            this.validationMemo.delete(this.validationMemo.keys().next().value);
+        }
+        this.validationMemo.set(memoKey, {
+            response: response.cached ? response : { ...response, cached: true },
+            expiresAt: Date.now() + this.validationCacheTTL * 1000
+        });
+    }
+
+    async getCachedValidation(cacheKey) {
+        if (!this.redisClient || !this.redisClient.isOpen) {
+            return null;
+        }
+
+        try {
+            const cached = await this.redisClient.get(cacheKey);
+            if (cached) {
+                validationCacheHits.inc({ hit_type: 'redis' });
+                return { ...JSON.parse(cached), cached: true };
+            }
+            validationCacheHits.inc({ hit_type: 'miss' });
+        } catch (redisError) {
+            console.warn(`Falha ao ler validação ${cacheKey} do Redis:`, redisError.message);
+            validationCacheHits.inc({ hit_type: 'error' });
+        }
+
         return null;
     }
 
+    cacheValidation(cacheKey, response) {
+        if (!this.redisClient || !this.redisClient.isOpen) {
+            return;
+        }
+
+        // Escritas são acumuladas e enviadas ao Redis numa única transação
+        this.validationCacheBuffer.push([cacheKey, JSON.stringify(response)]);
+
+        if (this.validationCacheBuffer.length >= this.validationCacheBatchSize) {
+            this.flushValidationCache();
+        } else if (!this.validationCacheFlushTimer) {
+            this.validationCacheFlushTimer = setTimeout(() => this.flushValidationCache(), 200);
+            this.validationCacheFlushTimer.unref();
+        }
+    }
+
+    async flushValidationCache() {
+        if (this.validationCacheFlushTimer) {
+            clearTimeout(this.validationCacheFlushTimer);
+            this.validationCacheFlushTimer = null;
+        }
+
+        const entries = this.validationCacheBuffer;
+        if (entries.length === 0) {
+            return;
+        }
+        this.validationCacheBuffer = [];
+
+        if (!this.redisClient || !this.redisClient.isOpen) {
+            return;
+        }
+
+        try {
+            const transaction = this.redisClient.multi();
+            for (const [cacheKey, value] of entries) {
+                transaction.setEx(cacheKey, this.validationCacheTTL, value);
+            }
+            await transaction.exec();
+        } catch (redisError) {
+            console.warn(`Falha ao armazenar ${entries.length} validações no Redis:`, redisError.message);
+        }
+    }
+
+    async shutdown() {
+        await this.flushValidationCache();
+
+        if (this.redisClient && this.redisClient.isOpen) {
+            try {
+                await this.redisClient.quit();
+            } catch (redisError) {
+                console.warn('Erro ao encerrar conexão Redis:', redisError.message);
+            }
+        }
+    }
+
     async validateCPA(request) {
         const startTime = Date.now();
         const { 
@@ -174,92 +907,54 @@ class CPARulesEngine {
             validationOption = 'opcao1' 
         } = request;
 
-        const results = [];
-        const rulesApplied = [];
-        const validationId = `${affiliateId}_${userId}_${Date.now()}`;
+        const validationId = `${affiliateId}_${userId}_${startTime}`;
 
         try {
-            console.log(`Iniciando validação CPA ${validationId} para afiliado ${affiliateId}`);
-
-            // Buscar configurações necessárias
-            const configKeys = [
-                `cpa.validacao.${validationOption}.deposito_minimo`,
-                `cpa.validacao.${validationOption}.numero_apostas`,
-                `cpa.validacao.${validationOption}.ggr_minimo`,
-                'cpa.validacao.prazo_dias',
-                'cpa.validacao.timezone',
-                'cpa.validacao.deteccao_fraude_ativa'
-            ];
-
-            const configs = {};
-            for (const key of configKeys) {
-                configs[key] = await this.getConfiguration(key);
+            // Reentregas da mesma requisição reaproveitam o resultado em cache. A
+            // memória local é consultada antes de carregar as configurações (a
+            // chave inclui a versão delas); o Redis, depois, com os valores. A
+            // versão é lida uma única vez: uma atualização em segundo plano que
+            // termine durante os awaits não pode receber um resultado calculado
+            // com as configurações anteriores.
+            const fingerprint = this.getValidationFingerprint(request, validationOption);
+            const memoKey = `${this.configState.version}:${fingerprint}`;
+            const memoized = this.getMemoizedValidation(memoKey);
+            if (memoized) {
+                console.log(`Validação CPA para afiliado ${affiliateId} servida do cache (${memoized.validationId})`);
+                return memoized;
             }
 
-            console.log(`Configurações carregadas para ${validationId}:`, configs);
-
-            // Validação 1: Depósito mínimo
-            const minDeposit = configs[`cpa.validacao.${validationOption}.deposito_minimo`];
-            if (minDeposit !== null) {
-                const valid = depositAmount >= minDeposit;
-                results.push(valid);
-                const message = `Depósito ${depositAmount} ${valid ? '>=' : '<'} ${minDeposit} (${valid ? 'APROVADO' : 'REJEITADO'})`;
-                rulesApplied.push(message);
-                console.log(`${validationId} - Validação depósito: ${message}`);
-            }
+            // Buscar configurações necessárias
+            const configs = await this.getRuleConfigs(validationOption);
 
-            // Validação 2: Número de apostas
-            const minBets = configs[`cpa.validacao.${validationOption}.numero_apostas`];
-            if (minBets !== null) {
-                const valid = betCount >= minBets;
-                results.push(valid);
-                const message = `Apostas ${betCount} ${valid ? '>=' : '<'} ${minBets} (${valid ? 'APROVADO' : 'REJEITADO'})`;
-                rulesApplied.push(message);
-                console.log(`${validationId} - Validação apostas: ${message}`);
+            const cacheKey = this.getValidationCacheKey(fingerprint, configs);
+            const cachedResponse = await this.getCachedValidation(cacheKey);
+            if (cachedResponse) {
+                this.memoizeValidation(memoKey, cachedResponse);
+                console.log(`Validação CPA para afiliado ${affiliateId} servida do cache (${cachedResponse.validationId})`);
+                return cachedResponse;
             }
 
-            // Validação 3: GGR mínimo (se configurado)
-            const minGGR = configs[`cpa.validacao.${validationOption}.ggr_minimo`];
-            if (minGGR !== null) {
-                const valid = ggrAmount >= minGGR;
-                results.push(valid);
-                const message = `GGR ${ggrAmount} ${valid ? '>=' : '<'} ${minGGR} (${valid ? 'APROVADO' : 'REJEITADO'})`;
-                rulesApplied.push(message);
-                console.log(`${validationId} - Validação GGR: ${message}`);
-            }
+            console.log(`Iniciando validação CPA ${validationId} para afiliado ${affiliateId}`);
 
-            // Validação 4: Prazo
-            const maxDays = configs['cpa.validacao.prazo_dias'];
-            if (maxDays !== null) {
-                const registrationTime = new Date(registrationDate).getTime();
-                const currentTime = Date.now();
-                const daysDiff = Math.floor((currentTime - registrationTime) / (1000 * 60 * 60 * 24));
-                const valid = daysDiff <= maxDays;
-                results.push(valid);
-                const message = `Prazo ${daysDiff} dias ${valid ? '<=' : '>'} ${maxDays} dias (${valid ? 'APROVADO' : 'REJEITADO'})`;
-                rulesApplied.push(message);
-                console.log(`${validationId} - Validação prazo: ${message}`);
+            if (DEBUG_LOGS) {
+                console.log(`Configurações carregadas para ${validationId}: ${JSON.stringify(configs)}`);
             }
 
-            // Validação 5: Detecção de fraude
-            const fraudDetection = configs['cpa.validacao.deteccao_fraude_ativa'];
-            if (fraudDetection) {
-                const fraudResult = this.detectFraud({
-                    depositAmount,
-                    betCount,
-                    ggrAmount,
-                    registrationDate,
-                    affiliateId,
-                    userId
-                });
-                results.push(fraudResult.valid);
-                rulesApplied.push(fraudResult.message);
-                console.log(`${validationId} - Detecção fraude: ${fraudResult.message}`);
-            }
+            const { results, rulesApplied } = this.applyRules(
+                { affiliateId, userId, depositAmount, betCount, ggrAmount, registrationDate },
+                configs,
+                validationOption,
+                {
+                    logPrefix: DEBUG_LOGS ? validationId : null,
+                    now: startTime,
+                    limits: this.getRuleLimits(configs, validationOption)
+                }
+            );
 
             // Determinar resultado final
             const allValid = results.every(r => r);
-            const finalResult = allValid ? 'approved' : 'rejected';
+            const finalResult = allValid ? RESULT_APPROVED : RESULT_REJECTED;
             
             // Registrar métricas
             cpaValidationCounter.inc({
@@ -276,7 +971,7 @@ class CPARulesEngine {
             const response = {
                 validationId,
                 result: finalResult,
-                reason: allValid ? 'Todas as validações aprovadas' : 'Uma ou mais validações falharam',
+                reason: allValid ? REASON_APPROVED : REASON_REJECTED,
                 details: {
                     affiliateId,
                     userId,
@@ -284,7 +979,7 @@ class CPARulesEngine {
                     configsUsed: configs,
                     individualResults: rulesApplied.map((rule, index) => ({
                         rule,
-                        result: results[index] ? 'APROVADO' : 'REJEITADO'
+                        result: results[index] ? RULE_STATUS_APPROVED : RULE_STATUS_REJECTED
                     })),
                     processingTimeMs: Date.now() - startTime
                 },
@@ -292,6 +987,9 @@ class CPARulesEngine {
                 rulesApplied
             };
 
+            this.cacheValidation(cacheKey, response);
+            this.memoizeValidation(memoKey, response);
+
             console.log(`Validação ${validationId} concluída: ${finalResult.toUpperCase()}`);
             return response;
 
@@ -299,14 +997,14 @@ class CPARulesEngine {
             console.error(`Erro na validação ${validationId}:`, error);
             
             cpaValidationCounter.inc({
-                result: 'error',
+                result: RESULT_ERROR,
                 option: validationOption,
                 affiliate_id: affiliateId
             });
 
             return {
                 validationId,
-                result: 'error',
+                result: RESULT_ERROR,
                 reason: `Erro durante validação: ${error.message}`,
                 details: { 
                     error: error.message,
@@ -319,7 +1017,254 @@ class CPARulesEngine {
         }
     }
 
-    detectFraud({ depositAmount, betCount, ggrAmount, registrationDate, affiliateId, userId }) {
+    applyRules(lead, configs, validationOption, {
+        logPrefix = null,
+        onlyFailed = false,
+        now = Date.now(),
+        failed = null,
+        limits = compileRuleLimits(configs, validationOption)
+    } = {}) {
+        const { depositAmount, betCount, ggrAmount, registrationDate, affiliateId, userId } = lead;
+        const results = [];
+        const rulesApplied = [];
+
+        // Mensagens são montadas sob demanda; com onlyFailed as regras aprovadas
+        // são descartadas antes de formatar qualquer string
+        const record = (label, valid, describe) => {
+            if (valid && onlyFailed) {
+                return;
+            }
+            const message = describe();
+            results.push(valid);
+            rulesApplied.push(message);
+            if (logPrefix) {
+                console.log(`${logPrefix} - ${label}: ${message}`);
+            }
+        };
+
+        // Todas as regras são decididas de uma vez pela máscara do kernel; quem já
+        // avaliou o lead (validateBatch) repassa a máscara pronta
+        const registrationTime = parseRegistrationTime(registrationDate);
+        const mask = failed !== null ? failed : evaluateLead(
+            depositAmount,
+            betCount,
+            ggrAmount,
+            registrationTime,
+            limits.depositLimit,
+            limits.betsLimit,
+            limits.ggrLimit,
+            periodCutoff(now, limits.daysLimit),
+            newAccountCutoff(now),
+            limits.checkFraud
+        );
+
+        // Validação 1: Depósito mínimo
+        if (limits.minDeposit !== null) {
+            const valid = (mask & RULE_DEPOSIT) === 0;
+            record('Validação depósito', valid, () => `Depósito ${depositAmount} ${valid ? '>=' : '<'} ${limits.minDeposit} (${valid ? RULE_STATUS_APPROVED : RULE_STATUS_REJECTED})`);
+        }
+
+        // Validação 2: Número de apostas
+        if (limits.minBets !== null) {
+            const valid = (mask & RULE_BETS) === 0;
+            record('Validação apostas', valid, () => `Apostas ${betCount} ${valid ? '>=' : '<'} ${limits.minBets} (${valid ? RULE_STATUS_APPROVED : RULE_STATUS_REJECTED})`);
+        }
+
+        // Validação 3: GGR mínimo (se configurado)
+        if (limits.minGGR !== null) {
+            const valid = (mask & RULE_GGR) === 0;
+            record('Validação GGR', valid, () => `GGR ${ggrAmount} ${valid ? '>=' : '<'} ${limits.minGGR} (${valid ? RULE_STATUS_APPROVED : RULE_STATUS_REJECTED})`);
+        }
+
+        // Validação 4: Prazo
+        if (limits.maxDays !== null) {
+            const valid = (mask & RULE_PERIOD) === 0;
+            const daysDiff = Math.floor((now - registrationTime) / DAY_MS);
+            record('Validação prazo', valid, () => `Prazo ${daysDiff} dias ${valid ? '<=' : '>'} ${limits.maxDays} dias (${valid ? RULE_STATUS_APPROVED : RULE_STATUS_REJECTED})`);
+        }
+
+        // Validação 5: Detecção de fraude (detectFraud só é chamado para descrever os padrões)
+        if (limits.checkFraud) {
+            const valid = (mask & RULE_FRAUD) === 0;
+            record('Detecção fraude', valid, () => valid
+                ? 'Nenhum padrão suspeito detectado'
+                : this.detectFraud({
+                    depositAmount,
+                    betCount,
+                    ggrAmount,
+                    registrationDate,
+                    affiliateId,
+                    userId,
+                    now
+                }).message);
+        }
+
+        return { results, rulesApplied };
+    }
+
+    // Colunas do lote com capacidade crescente: só realoca quando um lote maior
+    // que todos os anteriores chega, evitando alocar e coletar arrays a cada lote
+    // Com shared = false as colunas são exclusivas do lote, para lotes que cedem
+    // o event loop (await) enquanto ainda as usam
+    getBatchColumns(size, shared = true) {
+        if (!shared) {
+            return {
+                deposits: new Float64Array(size),
+                bets: new Float64Array(size),
+                ggr: new Float64Array(size),
+                registrationTimes: new Float64Array(size),
+                failed: new Uint8Array(size)
+            };
+        }
+
+        if (!this.batchColumns || this.batchColumns.capacity < size) {
+            const capacity = Math.max(size, this.batchColumns ? this.batchColumns.capacity * 2 : 1024);
+            this.batchColumns = {
+                capacity,
+                deposits: new Float64Array(capacity),
+                bets: new Float64Array(capacity),
+                ggr: new Float64Array(capacity),
+                registrationTimes: new Float64Array(capacity),
+                failed: new Uint8Array(capacity)
+            };
+        }
+
+        const columns = this.batchColumns;
+        return {
+            deposits: columns.deposits.subarray(0, size),
+            bets: columns.bets.subarray(0, size),
+            ggr: columns.ggr.subarray(0, size),
+            registrationTimes: columns.registrationTimes.subarray(0, size),
+            failed: columns.failed.subarray(0, size)
+        };
+    }
+
+    // Lotes maiores que batchYieldSize cedem o event loop a cada bloco de
+    // resultados montados, para não atrasar as demais requisições do processo;
+    // onProgress(processados, total) é chamado ao fim de cada bloco
+    async validateBatch(requests, validationOption = 'opcao1', {
+        verbose = false,
+        registrationTimes = null,
+        onProgress = null
+    } = {}) {
+        const startTime = Date.now();
+        const batchId = `batch_${validationOption}_${startTime}`;
+        const total = requests.length;
+
+        console.log(`Iniciando validação CPA em lote ${batchId} com ${total} leads`);
+
+        // Configurações são carregadas uma única vez para todo o lote
+        const configs = await this.getRuleConfigs(validationOption);
+        const limits = this.getRuleLimits(configs, validationOption);
+
+        // Colunas reaproveitadas entre lotes só quando não há await entre o
+        // preenchimento do lote e o fim do seu uso abaixo
+        const yieldEvery = this.batchYieldSize;
+        const columns = this.getBatchColumns(total, total <= yieldEvery);
+        const batch = LeadBatch.fromRequests(requests, columns, registrationTimes);
+        const failed = columns.failed;
+
+        // Avaliar todas as regras numa única passada sobre as colunas
+        const now = Date.now();
+        evaluateBatch(batch, limits, now, failed);
+
+        // Materializar detalhes apenas para os leads rejeitados. As métricas são
+        // contadas por afiliado e registradas uma vez por grupo ao final.
+        const results = new Array(total);
+        const countsByResult = {
+            [RESULT_APPROVED]: new Map(),
+            [RESULT_REJECTED]: new Map()
+        };
+        const verboseDetails = verbose ? new Map() : null;
+        let approved = 0;
+        for (let i = 0; i < total; i++) {
+            if (i > 0 && i % yieldEvery === 0) {
+                if (onProgress) {
+                    onProgress(i, total);
+                }
+                await new Promise(resolve => setImmediate(resolve));
+            }
+
+            const lead = requests[i];
+            const validationId = `${lead.affiliateId}_${lead.userId}_${startTime}_${i}`;
+            const result = failed[i] === 0 ? RESULT_APPROVED : RESULT_REJECTED;
+
+            const counts = countsByResult[result];
+            counts.set(lead.affiliateId, (counts.get(lead.affiliateId) || 0) + 1);
+
+            if (failed[i] === 0) {
+                approved++;
+                results[i] = new BatchLeadResult(validationId, lead.affiliateId, lead.userId, result);
+                continue;
+            }
+
+            // Mensagens por regra só são formatadas quando solicitadas. Elas só
+            // dependem dos valores numéricos do lead, então leads repetidos no
+            // lote (reenvios, fan-out) reaproveitam a lista já montada.
+            let individualResults = null;
+            if (verbose) {
+                const fingerprint = `${failed[i]}:${batch.deposits[i]}:${batch.bets[i]}:${batch.ggr[i]}:${batch.registrationTimes[i]}`;
+                individualResults = verboseDetails.get(fingerprint);
+                if (individualResults === undefined) {
+                    const { rulesApplied } = this.applyRules(lead, configs, validationOption, {
+                        onlyFailed: true,
+                        now,
+                        failed: failed[i],
+                        limits
+                    });
+                    individualResults = rulesApplied.map(rule => ({ rule, result: RULE_STATUS_REJECTED }));
+                    verboseDetails.set(fingerprint, individualResults);
+                }
+            }
+
+            results[i] = new BatchLeadResult(
+                validationId,
+                lead.affiliateId,
+                lead.userId,
+                result,
+                REASON_REJECTED,
+                failedRuleNames(failed[i]),
+                individualResults
+            );
+        }
+
+        if (onProgress) {
+            onProgress(total, total);
+        }
+
+        for (const [result, counts] of Object.entries(countsByResult)) {
+            for (const [affiliateId, count] of counts) {
+                cpaValidationCounter.inc({
+                    result,
+                    option: validationOption,
+                    affiliate_id: affiliateId
+                }, count);
+            }
+        }
+
+        cpaBatchValidationDuration.observe(
+            { option: validationOption },
+            (Date.now() - startTime) / 1000
+        );
+
+        console.log(`Validação em lote ${batchId} concluída: ${approved}/${total} aprovados`);
+
+        return {
+            batchId,
+            validationOption,
+            summary: {
+                total,
+                approved,
+                rejected: total - approved
+            },
+            configsUsed: configs,
+            results,
+            processingTimeMs: Date.now() - startTime,
+            timestamp: new Date().toISOString()
+        };
+    }
+
+    detectFraud({ depositAmount, betCount, ggrAmount, registrationDate, affiliateId, userId, now = Date.now() }) {
         const suspiciousPatterns = [];
         
         try {
@@ -334,8 +1279,8 @@ class CPARulesEngine {
             }
             
             // Padrão 3: Atividade alta em conta nova
-            const registrationTime = new Date(registrationDate).getTime();
-            const daysSinceRegistration = Math.floor((Date.now() - registrationTime) / (1000 * 60 * 60 * 24));
+            const registrationTime = parseRegistrationTime(registrationDate);
+            const daysSinceRegistration = Math.floor((now - registrationTime) / (1000 * 60 * 60 * 24));
             
             if (daysSinceRegistration < 1 && betCount > 50) {
                 suspiciousPatterns.push(`Atividade muito alta (${betCount} apostas) para conta nova (${daysSinceRegistration} dias)`);
@@ -375,19 +1320,7 @@ class CPARulesEngine {
 
     async getActiveRules(validationOption = 'opcao1') {
         try {
-            const configKeys = [
-                `cpa.validacao.${validationOption}.deposito_minimo`,
-                `cpa.validacao.${validationOption}.numero_apostas`,
-                `cpa.validacao.${validationOption}.ggr_minimo`,
-                'cpa.validacao.prazo_dias',
-                'cpa.validacao.timezone',
-                'cpa.validacao.deteccao_fraude_ativa'
-            ];
-
-            const rules = {};
-            for (const key of configKeys) {
-                rules[key] = await this.getConfiguration(key);
-            }
+            const rules = await this.getRuleConfigs(validationOption);
 
             return {
                 validationOption,
@@ -400,62 +1333,94 @@ class CPARulesEngine {
         }
     }
 
+    // Resultado do health check reaproveitado por HEALTH_CHECK_TTL ms, e
+    // verificações simultâneas compartilham a mesma execução: probes frequentes
+    // de load balancers não multiplicam as chamadas ao config-service e Redis
     async healthCheck() {
+        if (this.healthCache && this.healthCache.expiresAt > Date.now()) {
+            return this.healthCache.health;
+        }
+
+        if (!this.healthCheckInFlight) {
+            this.healthCheckInFlight = this.checkHealth()
+                .then(health => {
+                    this.healthCache = { health, expiresAt: Date.now() + this.healthCheckTTL };
+                    return health;
+                })
+                .finally(() => {
+                    this.healthCheckInFlight = null;
+                });
+        }
+        return this.healthCheckInFlight;
+    }
+
+    async checkHealth() {
         const health = {
             status: 'healthy',
             timestamp: new Date().toISOString(),
             components: {}
         };
 
-        // Verificar config-service
+        // config-service e Redis são verificados em paralelo: a latência do
+        // health check passa a ser a da dependência mais lenta, não a soma
+        const [configService, redis] = await Promise.all([
+            this.checkConfigService(),
+            this.checkRedis()
+        ]);
+        health.components.configService = configService;
+        health.components.redis = redis;
+        if (configService.status !== 'healthy' || redis.status !== 'healthy') {
+            health.status = 'degraded';
+        }
+
+        // Verificar cache local
+        health.components.localCache = {
+            status: 'healthy',
+            size: this.cache.size,
+            ttl: this.cacheTTL
+        };
+
+        return health;
+    }
+
+    async checkConfigService() {
         try {
-            const response = await axios.get(`${this.configServiceUrl}/health`, { timeout: 3000 });
-            health.components.configService = {
+            const response = await this.httpClient.get('/health', { timeout: 3000 });
+            return {
                 status: 'healthy',
                 url: this.configServiceUrl,
                 responseTime: response.headers['x-response-time'] || 'unknown'
             };
         } catch (error) {
-            health.components.configService = {
+            return {
                 status: 'unhealthy',
                 error: error.message,
                 url: this.configServiceUrl
             };
-            health.status = 'degraded';
         }
+    }
 
-        // Verificar Redis
-        if (this.redisClient && this.redisClient.isOpen) {
-            try {
-                await this.redisClient.ping();
-                health.components.redis = {
-                    status: 'healthy',
-                    url: this.redisUrl
-                };
-            } catch (error) {
-                health.components.redis = {
-                    status: 'unhealthy',
-                    error: error.message,
-                    url: this.redisUrl
-                };
-                health.status = 'degraded';
-            }
-        } else {
-            health.components.redis = {
+    async checkRedis() {
+        if (!this.redisClient || !this.redisClient.isOpen) {
+            return {
                 status: 'disconnected',
                 url: this.redisUrl
             };
-            health.status = 'degraded';
         }
 
-        // Verificar cache local
-        health.components.localCache = {
-            status: 'healthy',
-            size: this.cache.size,
-            ttl: this.cacheTTL
-        };
-
-        return health;
+        try {
+            await this.redisClient.ping();
+            return {
+                status: 'healthy',
+                url: this.redisUrl
+            };
+        } catch (error) {
+            return {
+                status: 'unhealthy',
+                error: error.message,
+                url: this.redisUrl
+            };
+        }
     }
 
     getMetrics() {
@@ -463,5 +1428,8 @@ class CPARulesEngine {
     }
 }
 
+CPARulesEngine.serializeBatchResults = serializeBatchResults;
+CPARulesEngine.parseRegistrationTime = parseRegistrationTime;
+
 module.exports = CPARulesEngine;
 
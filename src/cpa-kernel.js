@@ -0,0 +1,91 @@
+// Kernel numérico da validação CPA: funções puras sobre números, sem
+// dependências, mantidas monomórficas para que o JIT do V8 as compile
+
+// Bits de falha por regra retornados pelo kernel de avaliação
+const RULE_DEPOSIT = 1;
+const RULE_BETS = 2;
+const RULE_GGR = 4;
+const RULE_PERIOD = 8;
+const RULE_FRAUD = 16;
+
+const DAY_MS = 1000 * 60 * 60 * 24;
+
+// Instantes de corte do prazo e de "conta nova" para um dado `now`. Comparar o
+// timestamp de cadastro com o corte equivale a floor((now - cadastro) / dia)
+// <= maxDays (e < 1 para conta nova), sem a divisão por lead. maxDays infinito
+// resulta em -Infinity (sempre aprova) e NaN continua sempre reprovando.
+function periodCutoff(now, maxDays) {
+    return now - (Math.floor(maxDays) + 1) * DAY_MS;
+}
+
+function newAccountCutoff(now) {
+    return now - DAY_MS;
+}
+
+// Padrões numéricos de fraude (mesmos critérios de detectFraud, sem montar
+// mensagens). Comparações simples vêm primeiro para que o curto-circuito evite
+// a divisão do valor médio por aposta sempre que possível.
+function isSuspicious(deposit, bets, ggr, isNewAccount) {
+    return ggr < -500 ||
+        ggr > deposit * 2 ||
+        (deposit > 1000 && bets < 5) ||
+        (isNewAccount && bets > 50) ||
+        (bets > 0 && deposit / bets > 200);
+}
+
+// Kernel numérico de avaliação de um lead: recebe apenas números e retorna a
+// máscara de regras reprovadas (0 = aprovado). Regras desativadas recebem
+// limites infinitos, mantendo a função monomórfica para o JIT do V8. As
+// entradas do lead chegam já validadas como números pelos endpoints; o prazo
+// é decidido comparando o timestamp de cadastro (ms) com os cortes
+// precomputados (ver periodCutoff/newAccountCutoff).
+function evaluateLead(deposit, bets, ggr, registrationTime, minDeposit, minBets, minGGR, registeredAfter, newAccountAfter, checkFraud) {
+    let failed = 0;
+    if (!(deposit >= minDeposit)) failed |= RULE_DEPOSIT;
+    if (!(bets >= minBets)) failed |= RULE_BETS;
+    if (!(ggr >= minGGR)) failed |= RULE_GGR;
+    if (!(registrationTime > registeredAfter)) failed |= RULE_PERIOD;
+    if (checkFraud && isSuspicious(deposit, bets, ggr, registrationTime > newAccountAfter)) failed |= RULE_FRAUD;
+    return failed;
+}
+
+// Avalia todas as linhas de um lote colunar (ver LeadBatch) gravando a máscara
+// de regras reprovadas de cada lead em `failed`. Os limites e os cortes de
+// data são calculados uma única vez antes do laço.
+function evaluateBatch(batch, limits, now, failed) {
+    const { size, deposits, bets, ggr, registrationTimes } = batch;
+    const { depositLimit, betsLimit, ggrLimit, daysLimit, checkFraud } = limits;
+    const registeredAfter = periodCutoff(now, daysLimit);
+    const newAccountAfter = newAccountCutoff(now);
+
+    for (let i = 0; i < size; i++) {
+        failed[i] = evaluateLead(
+            deposits[i],
+            bets[i],
+            ggr[i],
+            registrationTimes[i],
+            depositLimit,
+            betsLimit,
+            ggrLimit,
+            registeredAfter,
+            newAccountAfter,
+            checkFraud
+        );
+    }
+
+    return failed;
+}
+
+module.exports = {
+    RULE_DEPOSIT,
+    RULE_BETS,
+    RULE_GGR,
+    RULE_PERIOD,
+    RULE_FRAUD,
+    DAY_MS,
+    periodCutoff,
+    newAccountCutoff,
+    isSuspicious,
+    evaluateLead,
+    evaluateBatch
+};
@@ -1,14 +1,24 @@
+const cluster = require('cluster');
 const express = require('express');
 const cors = require('cors');
+const compression = require('compression');
 const helmet = require('helmet');
 const morgan = require('morgan');
 const { Pool } = require('pg');
+const { decode: decodeMsgpack } = require('@msgpack/msgpack');
 const CPARulesEngine = require('./cpa-engine');
 require('dotenv').config();
 
 const app = express();
 const PORT = process.env.PORT || 3000;
 const SERVICE_NAME = 'integration-service';
+const CPA_BATCH_MAX_SIZE = parseInt(process.env.CPA_BATCH_MAX_SIZE) || 10000;
+const CPA_BATCH_STREAM_CHUNK = parseInt(process.env.CPA_BATCH_STREAM_CHUNK) || 500;
+const BODY_LIMIT = process.env.JSON_BODY_LIMIT || '5mb';
+const WEB_CONCURRENCY = parseInt(process.env.WEB_CONCURRENCY) || 1;
+// Maior que o timeout ocioso de load balancers/ingress (60s), para que o
+// servidor nunca feche primeiro uma conexão keep-alive que o proxy vai reusar
+const HTTP_KEEP_ALIVE_TIMEOUT = parseInt(process.env.HTTP_KEEP_ALIVE_TIMEOUT) || 75000;
 
 // Inicializar motor de regras CPA
 const cpaEngine = new CPARulesEngine();
@@ -23,16 +33,101 @@ const externalDbPool = new Pool({
     ssl: false,
     connectionTimeoutMillis: 5000,
     idleTimeoutMillis: 30000,
-    max: 10
+    // TCP keep-alive mantém as conexões ociosas do pool vivas através de
+    // NAT/firewalls, evitando reabrir conexões (e handshakes) sob rajadas
+    keepAlive: true,
+    max: parseInt(process.env.EXTERNAL_DB_POOL_MAX) || 10
 });
 
+// Consultas fixas como prepared statements nomeados: o PostgreSQL faz parse e
+// planejamento uma única vez por conexão do pool e reaproveita nas chamadas seguintes
+const QUERIES = {
+    testConnection: {
+        name: 'test-connection',
+        text: 'SELECT NOW() as current_time, version() as db_version'
+    },
+    listTables: {
+        name: 'list-tables',
+        text: `
+            SELECT table_name, table_type 
+            FROM information_schema.tables 
+            WHERE table_schema = 'public' 
+            ORDER BY table_name
+        `
+    },
+    databaseStats: {
+        name: 'database-stats',
+        text: `
+            SELECT 
+                schemaname,
+                tablename,
+                n_tup_ins as inserts,
+                n_tup_upd as updates,
+                n_tup_del as deletes,
+                n_live_tup as live_tuples,
+                n_dead_tup as dead_tuples
+            FROM pg_stat_user_tables 
+            ORDER BY n_live_tup DESC
+            LIMIT 20
+        `
+    }
+};
+
+// Timestamp ISO das respostas de health/status, regenerado no máximo uma vez
+// por segundo: probes frequentes não alocam uma data e string por chamada
+let isoTimestampCache = { second: -1, value: '' };
+
+function cachedISOTimestamp() {
+    const now = Date.now();
+    const second = Math.floor(now / 1000);
+    if (second !== isoTimestampCache.second) {
+        isoTimestampCache = { second, value: new Date(now).toISOString() };
+    }
+    return isoTimestampCache.value;
+}
+
 // Middleware
 app.use(helmet());
 app.use(cors());
 app.use(morgan('combined'));
-app.use(express.json());
+// Respostas JSON grandes (lotes com milhares de resultados) são muito
+// repetitivas e encolhem bastante com gzip; respostas pequenas seguem sem
+// compressão para não gastar CPU à toa
+app.use(compression({
+    threshold: process.env.COMPRESSION_THRESHOLD || '1kb',
+    level: parseInt(process.env.COMPRESSION_LEVEL) || 5
+}));
+app.use(express.json({ limit: BODY_LIMIT }));
 app.use(express.urlencoded({ extended: true }));
 
+// Corpo em MessagePack (Content-Type: application/msgpack) como alternativa ao
+// JSON no tráfego entre serviços; decodificado para o mesmo objeto que
+// express.json entregaria às rotas de validação
+const msgpackBody = [
+    express.raw({ type: 'application/msgpack', limit: BODY_LIMIT }),
+    (req, res, next) => {
+        if (!Buffer.isBuffer(req.body)) {
+            return next();
+        }
+        try {
+            req.body = decodeMsgpack(req.body);
+        } catch (error) {
+            return res.status(400).json({
+                status: 'error',
+                message: 'Corpo MessagePack inválido',
+                error: error.message
+            });
+        }
+        if (!req.body || typeof req.body !== 'object') {
+            return res.status(400).json({
+                status: 'error',
+                message: 'Corpo MessagePack deve ser um objeto'
+            });
+        }
+        next();
+    }
+];
+
 // Health check endpoint
 app.get('/health', async (req, res) => {
     try {
@@ -41,7 +136,7 @@ app.get('/health', async (req, res) => {
         res.status(200).json({
             status: 'ok',
             service: SERVICE_NAME,
-            timestamp: new Date().toISOString(),
+            timestamp: cachedISOTimestamp(),
             version: '1.0.0',
             environment: process.env.NODE_ENV || 'development',
             components: {
@@ -52,7 +147,7 @@ app.get('/health', async (req, res) => {
         res.status(503).json({
             status: 'degraded',
             service: SERVICE_NAME,
-            timestamp: new Date().toISOString(),
+            timestamp: cachedISOTimestamp(),
             error: error.message
         });
     }
@@ -70,6 +165,7 @@ app.get('/', (req, res) => {
             metrics: '/metrics',
             api: `/api/v1/${SERVICE_NAME}`,
             cpaValidation: '/api/v1/integration-service/validate-cpa',
+            cpaBatchValidation: '/api/v1/integration-service/validate-cpa-batch',
             cpaRules: '/api/v1/integration-service/cpa-rules',
             testConnection: '/api/v1/integration-service/test-connection',
             syncData: '/api/v1/integration-service/sync-data'
@@ -94,70 +190,276 @@ app.get('/metrics', async (req, res) => {
 
 // ==================== ENDPOINTS CPA ====================
 
+// Campos obrigatórios de uma requisição CPA
+const CPA_REQUIRED_FIELDS = Object.freeze(['affiliateId', 'userId', 'depositAmount', 'betCount', 'ggrAmount', 'registrationDate']);
+
+// Validar campos obrigatórios e tipos de uma requisição CPA; retorna null se válida.
+// Quem já converteu a data de registro (validação em lote) repassa o timestamp.
+function validateCPAPayload(validationRequest, registrationTime = CPARulesEngine.parseRegistrationTime(validationRequest.registrationDate)) {
+    // A lista de ausentes só é alocada quando algum campo falta
+    let missing = null;
+    for (const field of CPA_REQUIRED_FIELDS) {
+        if (!validationRequest[field] && validationRequest[field] !== 0) {
+            (missing || (missing = [])).push(field);
+        }
+    }
+    
+    if (missing !== null) {
+        return {
+            message: `Campos obrigatórios ausentes: ${missing.join(', ')}`,
+            required_fields: CPA_REQUIRED_FIELDS,
+            received_fields: Object.keys(validationRequest)
+        };
+    }
+    
+    // Validar tipos de dados. Number.isFinite porque MessagePack, ao contrário
+    // do JSON, transporta NaN e ±Infinity
+    if (!Number.isFinite(validationRequest.depositAmount) || validationRequest.depositAmount < 0) {
+        return { message: 'depositAmount deve ser um número positivo' };
+    }
+    
+    if (!Number.isFinite(validationRequest.betCount) || validationRequest.betCount < 0) {
+        return { message: 'betCount deve ser um número inteiro positivo' };
+    }
+    
+    if (!Number.isFinite(validationRequest.ggrAmount)) {
+        return { message: 'ggrAmount deve ser um número' };
+    }
+    
+    // Validar data de registro
+    if (isNaN(registrationTime)) {
+        return { message: 'registrationDate deve ser uma data válida' };
+    }
+    
+    return null;
+}
+
 // Endpoint principal para validação CPA
-app.post('/api/v1/integration-service/validate-cpa', async (req, res) => {
+app.post('/api/v1/integration-service/validate-cpa', msgpackBody, async (req, res) => {
     try {
         const validationRequest = req.body;
         
-        // Validar campos obrigatórios
-        const required = ['affiliateId', 'userId', 'depositAmount', 'betCount', 'ggrAmount', 'registrationDate'];
-        const missing = required.filter(field => !validationRequest[field] && validationRequest[field] !== 0);
-        
-        if (missing.length > 0) {
+        const validationError = validateCPAPayload(validationRequest);
+        if (validationError) {
             return res.status(400).json({
                 status: 'error',
-                message: `Campos obrigatórios ausentes: ${missing.join(', ')}`,
-                required_fields: required,
-                received_fields: Object.keys(validationRequest)
+                ...validationError
             });
         }
         
-        // Validar tipos de dados
-        if (typeof validationRequest.depositAmount !== 'number' || validationRequest.depositAmount < 0) {
+        // Executar validação CPA
+        console.log(`Recebida requisição de validação CPA para afiliado ${validationRequest.affiliateId}`);
+        const result = await cpaEngine.validateCPA(validationRequest);
+        
+        res.json({
+            status: 'success',
+            message: 'Validação CPA executada com sucesso',
+            data: result
+        });
+        
+    } catch (error) {
+        console.error('Erro na validação CPA:', error);
+        res.status(500).json({
+            status: 'error',
+            message: 'Erro interno na validação CPA',
+            error: error.message,
+            timestamp: new Date().toISOString()
+        });
+    }
+});
+
+// Espera o próximo 'drain' (ou 'close') da resposta com um único par de
+// listeners por resposta. O middleware de compressão redireciona
+// res.on('drain') para o stream zlib, mas não res.off/removeListener (nem a
+// remoção feita por once), então listeners registrados a cada trecho nunca
+// seriam removidos.
+const drainWaiters = new WeakMap();
+
+function waitForDrain(res) {
+    let waiter = drainWaiters.get(res);
+    if (!waiter) {
+        waiter = { resolve: null };
+        const release = () => {
+            const resolve = waiter.resolve;
+            waiter.resolve = null;
+            if (resolve) {
+                resolve();
+            }
+        };
+        res.on('drain', release);
+        res.on('close', release);
+        drainWaiters.set(res, waiter);
+    }
+    return new Promise(resolve => {
+        waiter.resolve = resolve;
+    });
+}
+
+// Escreve um trecho da resposta respeitando o backpressure do socket. Com o
+// cliente já desconectado não há 'drain' nem 'close' por vir: resolve na hora.
+function writeChunk(res, chunk) {
+    if (res.destroyed || res.writableEnded) {
+        return Promise.resolve();
+    }
+    if (res.write(chunk) || res.destroyed) {
+        return Promise.resolve();
+    }
+    return waitForDrain(res);
+}
+
+// Início constante do envelope da resposta em lote
+const BATCH_RESPONSE_PREFIX = JSON.stringify({
+    status: 'success',
+    message: 'Validação CPA em lote executada com sucesso'
+}).slice(0, -1) + ',"data":';
+
+// Envia a resposta do lote em trechos (chunked) em vez de montar o JSON
+// inteiro numa única string: cada bloco de resultados é serializado e
+// escrito em seguida, mantendo o pico de memória proporcional ao bloco.
+// res.json calcularia ainda um ETag (hash de todo o corpo), inútil num POST.
+async function streamBatchResponse(res, result) {
+    res.status(200).set('Content-Type', 'application/json; charset=utf-8');
+    await writeBatchBody(res, result);
+    res.end();
+}
+
+// Escreve o JSON completo da resposta do lote, bloco a bloco, sem encerrar a resposta
+async function writeBatchBody(res, result) {
+    const { batchId, validationOption, summary, configsUsed, results, processingTimeMs, timestamp } = result;
+
+    const head = BATCH_RESPONSE_PREFIX +
+        JSON.stringify({ batchId, validationOption, summary, configsUsed }).slice(0, -1) +
+        ',"results":[';
+    await writeChunk(res, head);
+
+    for (let start = 0; start < results.length && !res.destroyed; start += CPA_BATCH_STREAM_CHUNK) {
+        const end = Math.min(start + CPA_BATCH_STREAM_CHUNK, results.length);
+        const chunk = CPARulesEngine.serializeBatchResults(results, start, end);
+        await writeChunk(res, start === 0 ? chunk : `,${chunk}`);
+    }
+
+    if (res.destroyed) {
+        return;
+    }
+    await writeChunk(res, `],"processingTimeMs":${JSON.stringify(processingTimeMs)},"timestamp":${JSON.stringify(timestamp)}}}`);
+}
+
+// Evento Server-Sent Events; flush força o envio imediato quando a resposta
+// passa pelo middleware de compressão
+function writeEvent(res, event, data) {
+    if (res.destroyed || res.writableEnded) {
+        return;
+    }
+    res.write(`event: ${event}\ndata: ${JSON.stringify(data)}\n\n`);
+    if (typeof res.flush === 'function') {
+        res.flush();
+    }
+}
+
+// Endpoint para validação CPA em lote
+app.post('/api/v1/integration-service/validate-cpa-batch', msgpackBody, async (req, res) => {
+    // Com Accept: text/event-stream o progresso é enviado como eventos SSE
+    // ("progress") e o resultado completo num evento final ("result")
+    const streamProgress = (req.get('Accept') || '').includes('text/event-stream');
+    
+    try {
+        const { leads, validationOption = 'opcao1', verbose = false } = req.body;
+        
+        if (!Array.isArray(leads) || leads.length === 0) {
             return res.status(400).json({
                 status: 'error',
-                message: 'depositAmount deve ser um número positivo'
+                message: 'leads deve ser uma lista não vazia de requisições CPA'
             });
         }
         
-        if (typeof validationRequest.betCount !== 'number' || validationRequest.betCount < 0) {
+        if (leads.length > CPA_BATCH_MAX_SIZE) {
             return res.status(400).json({
                 status: 'error',
-                message: 'betCount deve ser um número inteiro positivo'
+                message: `Lote excede o tamanho máximo de ${CPA_BATCH_MAX_SIZE} leads`
             });
         }
         
-        if (typeof validationRequest.ggrAmount !== 'number') {
+        if (!['opcao1', 'opcao2'].includes(validationOption)) {
             return res.status(400).json({
                 status: 'error',
-                message: 'ggrAmount deve ser um número'
+                message: 'Opção de validação deve ser "opcao1" ou "opcao2"'
             });
         }
         
-        // Validar data de registro
-        const registrationDate = new Date(validationRequest.registrationDate);
-        if (isNaN(registrationDate.getTime())) {
+        // Validação e conversão das datas numa única passada: o motor recebe os
+        // timestamps prontos e não volta a converter cada data
+        const errors = [];
+        const registrationTimes = new Float64Array(leads.length);
+        for (let index = 0; index < leads.length; index++) {
+            const lead = leads[index];
+            let validationError;
+            if (lead && typeof lead === 'object') {
+                registrationTimes[index] = CPARulesEngine.parseRegistrationTime(lead.registrationDate);
+                validationError = validateCPAPayload(lead, registrationTimes[index]);
+            } else {
+                validationError = { message: 'Lead deve ser um objeto' };
+            }
+            if (validationError) {
+                errors.push({ index, message: validationError.message });
+            }
+        }
+        
+        if (errors.length > 0) {
             return res.status(400).json({
                 status: 'error',
-                message: 'registrationDate deve ser uma data válida'
+                message: `${errors.length} lead(s) inválido(s) no lote`,
+                errors
             });
         }
         
-        // Executar validação CPA
-        console.log(`Recebida requisição de validação CPA para afiliado ${validationRequest.affiliateId}`);
-        const result = await cpaEngine.validateCPA(validationRequest);
+        if (streamProgress) {
+            res.status(200).set({
+                'Content-Type': 'text/event-stream; charset=utf-8',
+                'Cache-Control': 'no-cache',
+                'Connection': 'keep-alive'
+            });
+            res.flushHeaders();
+        }
         
-        res.json({
-            status: 'success',
-            message: 'Validação CPA executada com sucesso',
-            data: result
+        const result = await cpaEngine.validateBatch(leads, validationOption, {
+            verbose: verbose === true,
+            registrationTimes,
+            onProgress: streamProgress
+                ? (processed, total) => writeEvent(res, 'progress', { processed, total })
+                : null
         });
         
+        if (streamProgress) {
+            await writeChunk(res, 'event: result\ndata: ');
+            await writeBatchBody(res, result);
+            if (typeof res.flush === 'function') {
+                res.flush();
+            }
+            res.end('\n\n');
+            return;
+        }
+        
+        await streamBatchResponse(res, result);
+        
     } catch (error) {
-        console.error('Erro na validação CPA:', error);
+        console.error('Erro na validação CPA em lote:', error);
+        if (res.headersSent) {
+            if (streamProgress && !res.writableEnded) {
+                writeEvent(res, 'error', {
+                    status: 'error',
+                    message: 'Erro interno na validação CPA em lote',
+                    error: error.message
+                });
+                res.end();
+                return;
+            }
+            // Resposta já parcialmente enviada: só resta interromper a conexão
+            res.destroy(error);
+            return;
+        }
         res.status(500).json({
             status: 'error',
-            message: 'Erro interno na validação CPA',
+            message: 'Erro interno na validação CPA em lote',
             error: error.message,
             timestamp: new Date().toISOString()
         });
@@ -194,66 +496,76 @@ app.get('/api/v1/integration-service/cpa-rules', async (req, res) => {
     }
 });
 
+// Cenários simulados do endpoint test-cpa, montados uma única vez
+const CPA_TEST_SCENARIOS = Object.freeze([
+    {
+        name: 'Cenário Aprovado',
+        daysSinceRegistration: 5,
+        data: {
+            affiliateId: 'TEST_AFF_001',
+            userId: 'TEST_USER_001',
+            depositAmount: 100.0,
+            betCount: 20,
+            ggrAmount: 50.0,
+            validationOption: 'opcao1'
+        }
+    },
+    {
+        name: 'Cenário Rejeitado - Depósito Baixo',
+        daysSinceRegistration: 2,
+        data: {
+            affiliateId: 'TEST_AFF_002',
+            userId: 'TEST_USER_002',
+            depositAmount: 10.0,
+            betCount: 5,
+            ggrAmount: 5.0,
+            validationOption: 'opcao1'
+        }
+    },
+    {
+        name: 'Cenário Fraude - Depósito Alto, Poucas Apostas',
+        daysSinceRegistration: 1,
+        data: {
+            affiliateId: 'TEST_AFF_003',
+            userId: 'TEST_USER_003',
+            depositAmount: 2000.0,
+            betCount: 3,
+            ggrAmount: 100.0,
+            validationOption: 'opcao1'
+        }
+    }
+]);
+
 // Endpoint para testar validação CPA com dados simulados
 app.post('/api/v1/integration-service/test-cpa', async (req, res) => {
     try {
-        const testScenarios = [
-            {
-                name: 'Cenário Aprovado',
-                data: {
-                    affiliateId: 'TEST_AFF_001',
-                    userId: 'TEST_USER_001',
-                    depositAmount: 100.0,
-                    betCount: 20,
-                    ggrAmount: 50.0,
-                    registrationDate: new Date(Date.now() - 5 * 24 * 60 * 60 * 1000).toISOString(),
-                    validationOption: 'opcao1'
-                }
-            },
-            {
-                name: 'Cenário Rejeitado - Depósito Baixo',
-                data: {
-                    affiliateId: 'TEST_AFF_002',
-                    userId: 'TEST_USER_002',
-                    depositAmount: 10.0,
-                    betCount: 5,
-                    ggrAmount: 5.0,
-                    registrationDate: new Date(Date.now() - 2 * 24 * 60 * 60 * 1000).toISOString(),
-                    validationOption: 'opcao1'
-                }
-            },
-            {
-                name: 'Cenário Fraude - Depósito Alto, Poucas Apostas',
-                data: {
-                    affiliateId: 'TEST_AFF_003',
-                    userId: 'TEST_USER_003',
-                    depositAmount: 2000.0,
-                    betCount: 3,
-                    ggrAmount: 100.0,
-                    registrationDate: new Date(Date.now() - 1 * 24 * 60 * 60 * 1000).toISOString(),
-                    validationOption: 'opcao1'
-                }
+        // Datas de cadastro são relativas ao momento do teste
+        const now = Date.now();
+        const testScenarios = CPA_TEST_SCENARIOS.map(({ name, daysSinceRegistration, data }) => ({
+            name,
+            data: {
+                ...data,
+                registrationDate: new Date(now - daysSinceRegistration * 24 * 60 * 60 * 1000).toISOString()
             }
-        ];
-        
-        const results = [];
+        }));
         
-        for (const scenario of testScenarios) {
+        // Cenários são independentes: executar em paralelo
+        const results = await Promise.all(testScenarios.map(async (scenario) => {
             try {
                 const result = await cpaEngine.validateCPA(scenario.data);
-                results.push({
+                return {
                     scenario: scenario.name,
                     input: scenario.data,
                     result: result
-                });
+                };
             } catch (error) {
-                results.push({
+                return {
                     scenario: scenario.name,
                     input: scenario.data,
                     error: error.message
-                });
+                };
             }
-        }
+        }));
         
         res.json({
             status: 'success',
@@ -261,7 +573,7 @@ app.post('/api/v1/integration-service/test-cpa', async (req, res) => {
             data: {
                 total_scenarios: testScenarios.length,
                 results: results,
-                timestamp: new Date().toISOString()
+                timestamp: cachedISOTimestamp()
             }
         });
         
@@ -282,7 +594,7 @@ app.get(`/api/v1/${SERVICE_NAME}`, (req, res) => {
     res.json({
         service: SERVICE_NAME,
         message: `API do ${SERVICE_NAME} funcionando`,
-        timestamp: new Date().toISOString(),
+        timestamp: cachedISOTimestamp(),
         data: {
             status: 'operational',
             features: ['health-check', 'cpa-validation', 'database-integration', 'metrics']
@@ -297,7 +609,7 @@ app.get(`/api/v1/${SERVICE_NAME}/status`, (req, res) => {
         status: 'running',
         uptime: process.uptime(),
         memory: process.memoryUsage(),
-        timestamp: new Date().toISOString()
+        timestamp: cachedISOTimestamp()
     });
 });
 
@@ -305,7 +617,7 @@ app.get(`/api/v1/${SERVICE_NAME}/status`, (req, res) => {
 app.get('/api/v1/integration-service/test-connection', async (req, res) => {
     try {
         const client = await externalDbPool.connect();
-        const result = await client.query('SELECT NOW() as current_time, version() as db_version');
+        const result = await client.query(QUERIES.testConnection);
         client.release();
         
         res.json({
@@ -341,12 +653,7 @@ app.get('/api/v1/integration-service/test-connection', async (req, res) => {
 app.get('/api/v1/integration-service/list-tables', async (req, res) => {
     try {
         const client = await externalDbPool.connect();
-        const result = await client.query(`
-            SELECT table_name, table_type 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            ORDER BY table_name
-        `);
+        const result = await client.query(QUERIES.listTables);
         client.release();
         
         res.json({
@@ -409,21 +716,7 @@ app.get('/api/v1/integration-service/database-stats', async (req, res) => {
         const client = await externalDbPool.connect();
         
         // Obter estatísticas básicas
-        const statsQuery = `
-            SELECT 
-                schemaname,
-                tablename,
-                n_tup_ins as inserts,
-                n_tup_upd as updates,
-                n_tup_del as deletes,
-                n_live_tup as live_tuples,
-                n_dead_tup as dead_tuples
-            FROM pg_stat_user_tables 
-            ORDER BY n_live_tup DESC
-            LIMIT 20
-        `;
-        
-        const result = await client.query(statsQuery);
+        const result = await client.query(QUERIES.databaseStats);
         client.release();
         
         res.json({
@@ -471,16 +764,23 @@ async function startServer() {
         await cpaEngine.initialize();
         console.log('✅ Motor de regras CPA inicializado com sucesso');
         
+        if (process.env.CPA_WARMUP !== 'false') {
+            cpaEngine.warmup();
+        }
+        
         // Start server
-        app.listen(PORT, '0.0.0.0', () => {
+        const server = app.listen(PORT, '0.0.0.0', () => {
             console.log(`🚀 ${SERVICE_NAME} rodando na porta ${PORT}`);
             console.log(`📊 Health check: http://localhost:${PORT}/health`);
             console.log(`📈 Métricas: http://localhost:${PORT}/metrics`);
             console.log(`🔗 API: http://localhost:${PORT}/api/v1/${SERVICE_NAME}`);
             console.log(`⚖️  Validação CPA: http://localhost:${PORT}/api/v1/integration-service/validate-cpa`);
+            console.log(`📦 Validação CPA em lote: http://localhost:${PORT}/api/v1/integration-service/validate-cpa-batch`);
             console.log(`📋 Regras CPA: http://localhost:${PORT}/api/v1/integration-service/cpa-rules`);
             console.log(`🧪 Teste CPA: http://localhost:${PORT}/api/v1/integration-service/test-cpa`);
         });
+        server.keepAliveTimeout = HTTP_KEEP_ALIVE_TIMEOUT;
+        server.headersTimeout = HTTP_KEEP_ALIVE_TIMEOUT + 1000;
         
     } catch (error) {
         console.error('❌ Erro ao inicializar servidor:', error);
@@ -489,22 +789,86 @@ async function startServer() {
 }
 
 // Graceful shutdown
-process.on('SIGTERM', () => {
-    console.log('📴 Recebido SIGTERM, encerrando servidor...');
+async function shutdown(signal) {
+    console.log(`📴 Recebido ${signal}, encerrando servidor...`);
+    await cpaEngine.shutdown();
     externalDbPool.end(() => {
         console.log('🔌 Pool de conexões fechado');
         process.exit(0);
     });
-});
+}
 
-process.on('SIGINT', () => {
-    console.log('📴 Recebido SIGINT, encerrando servidor...');
-    externalDbPool.end(() => {
-        console.log('🔌 Pool de conexões fechado');
-        process.exit(0);
+// Intervalo entre reinícios de workers: dobra a cada worker que cai antes de
+// WORKER_MIN_UPTIME_MS (porta em uso, configuração inválida) até o máximo,
+// evitando um laço de forks; volta a zero quando um worker se mantém de pé
+const WORKER_RESTART_DELAY_MS = 1000;
+const WORKER_RESTART_MAX_DELAY_MS = 30000;
+const WORKER_MIN_UPTIME_MS = 10000;
+
+// Processo primário do modo cluster: um worker por WEB_CONCURRENCY, todos
+// escutando a mesma porta; workers que caem são recriados
+function startCluster(workers) {
+    console.log(`🧩 Iniciando ${workers} workers do ${SERVICE_NAME}`);
+    const forkedAt = new Map();
+    const fork = () => {
+        const worker = cluster.fork();
+        forkedAt.set(worker.id, Date.now());
+    };
+    for (let i = 0; i < workers; i++) {
+        fork();
+    }
+
+    let shuttingDown = false;
+    let restartDelay = 0;
+    cluster.on('exit', (worker, code, signal) => {
+        const uptime = Date.now() - forkedAt.get(worker.id);
+        forkedAt.delete(worker.id);
+        if (shuttingDown) {
+            if (Object.keys(cluster.workers).length === 0) {
+                process.exit(0);
+            }
+            return;
+        }
+        restartDelay = uptime < WORKER_MIN_UPTIME_MS
+            ? Math.min(Math.max(restartDelay * 2, WORKER_RESTART_DELAY_MS), WORKER_RESTART_MAX_DELAY_MS)
+            : 0;
+        console.error(`❌ Worker ${worker.process.pid} encerrado (${signal || code}), reiniciando em ${restartDelay}ms...`);
+        setTimeout(() => {
+            if (!shuttingDown) {
+                fork();
+            }
+        }, restartDelay);
     });
-});
 
-// Iniciar servidor
-startServer();
+    // Repassar o sinal para que cada worker faça seu próprio graceful shutdown
+    const stopWorkers = (signal) => {
+        console.log(`📴 Recebido ${signal}, encerrando workers...`);
+        shuttingDown = true;
+        const running = Object.values(cluster.workers);
+        if (running.length === 0) {
+            process.exit(0);
+        }
+        for (const worker of running) {
+            worker.process.kill(signal);
+        }
+    };
+    process.on('SIGTERM', () => stopWorkers('SIGTERM'));
+    process.on('SIGINT', () => stopWorkers('SIGINT'));
+}
+
+// Só inicia o servidor quando executado diretamente (node src/server.js, que
+// também é o script dos workers do cluster); importado, apenas exporta o app
+if (require.main === module) {
+    if (cluster.isPrimary && WEB_CONCURRENCY > 1) {
+        startCluster(WEB_CONCURRENCY);
+    } else {
+        process.on('SIGTERM', () => shutdown('SIGTERM'));
+
+        process.on('SIGINT', () => shutdown('SIGINT'));
+
+        // Iniciar servidor
+        startServer();
+    }
+}
 
+module.exports = app;
@@ -0,0 +1,423 @@
+const promClient = require('prom-client');
+const CPARulesEngine = require('../src/cpa-engine');
+
+const CONFIGS = {
+    'cpa.validacao.opcao1.deposito_minimo': { value: '30', data_type: 'float' },
+    'cpa.validacao.opcao1.numero_apostas': { value: '10', data_type: 'int' },
+    'cpa.validacao.prazo_dias': { value: '30', data_type: 'int' },
+    'cpa.validacao.deteccao_fraude_ativa': { value: 'false', data_type: 'bool' }
+};
+
+function httpError(status) {
+    const error = new Error(`Request failed with status code ${status}`);
+    error.response = { status };
+    return error;
+}
+
+// Cliente HTTP falso do config-service: buscas individuais respondem a partir
+// de `configs` e a busca em lote usa `bulk` (por padrão, 404)
+function createConfigServiceStub(configs, bulk = () => Promise.reject(httpError(404))) {
+    const calls = { get: [], post: [] };
+    return {
+        calls,
+        get: async (url) => {
+            calls.get.push(url);
+            const key = url.split('/').pop();
+            if (!configs[key]) {
+                throw httpError(404);
+            }
+            return { status: 200, headers: {}, data: { success: true, data: { key, ...configs[key] } } };
+        },
+        post: async (url, body) => {
+            calls.post.push(body);
+            return bulk(body);
+        }
+    };
+}
+
+// Redis em memória com os comandos usados pelo engine
+function createRedisStub() {
+    const store = new Map();
+    return {
+        store,
+        isOpen: true,
+        get: async (key) => (store.has(key) ? store.get(key) : null),
+        mGet: async (keys) => keys.map(key => (store.has(key) ? store.get(key) : null)),
+        multi() {
+            const commands = [];
+            const transaction = {
+                setEx: (key, ttl, value) => {
+                    commands.push([key, value]);
+                    return transaction;
+                },
+                exec: async () => commands.forEach(([key, value]) => store.set(key, value))
+            };
+            return transaction;
+        }
+    };
+}
+
+// Cada engine usa uma URL própria para não compartilhar o cache local entre testes
+let engineCount = 0;
+function createEngine(httpClient = null) {
+    process.env.CONFIG_SERVICE_URL = `http://config-service.test/${++engineCount}`;
+    const engine = new CPARulesEngine();
+    if (httpClient) {
+        engine.httpClient = httpClient;
+    }
+    return engine;
+}
+
+const DAY_MS = 24 * 60 * 60 * 1000;
+const REGISTRATION_DATE = new Date(Date.now() - 5 * DAY_MS).toISOString();
+
+function lead(overrides = {}) {
+    return {
+        affiliateId: 'aff1',
+        userId: 'user1',
+        depositAmount: 100,
+        betCount: 20,
+        ggrAmount: 50,
+        registrationDate: REGISTRATION_DATE,
+        ...overrides
+    };
+}
+
+describe('CPARulesEngine', () => {
+    describe('validateBatch', () => {
+        const leads = [
+            lead({ userId: 'approved' }),
+            lead({ userId: 'low-deposit', depositAmount: 10 }),
+            lead({
+                userId: 'several',
+                depositAmount: 10,
+                betCount: 2,
+                registrationDate: new Date(Date.now() - 40 * DAY_MS).toISOString()
+            })
+        ];
+
+        test('should approve or reject each lead with its failed rules', async () => {
+            const engine = createEngine(createConfigServiceStub(CONFIGS));
+
+            const result = await engine.validateBatch(leads, 'opcao1');
+            expect(result.summary).toEqual({ total: 3, approved: 1, rejected: 2 });
+            expect(result.results.map(r => r.userId)).toEqual(['approved', 'low-deposit', 'several']);
+            expect(result.results[0]).toMatchObject({
+                result: 'approved',
+                reason: null,
+                failedRules: null,
+                individualResults: null
+            });
+            expect(result.results[1]).toMatchObject({
+                result: 'rejected',
+                reason: 'Uma ou mais validações falharam',
+                failedRules: ['deposito_minimo'],
+                individualResults: null
+            });
+            expect(result.results[2].failedRules).toEqual(['deposito_minimo', 'numero_apostas', 'prazo_dias']);
+        });
+
+        test('should describe only the failed rules in verbose mode', async () => {
+            const engine = createEngine(createConfigServiceStub(CONFIGS));
+
+            const { results } = await engine.validateBatch(leads, 'opcao1', { verbose: true });
+            expect(results[0].individualResults).toBeNull();
+            expect(results[1].individualResults).toEqual([
+                { rule: 'Depósito 10 < 30 (REJEITADO)', result: 'REJEITADO' }
+            ]);
+            expect(results[2].individualResults.map(r => r.rule)).toEqual([
+                'Depósito 10 < 30 (REJEITADO)',
+                'Apostas 2 < 10 (REJEITADO)',
+                'Prazo 40 dias > 30 dias (REJEITADO)'
+            ]);
+        });
+
+        test('should agree with validateCPA for every lead', async () => {
+            const engine = createEngine(createConfigServiceStub({
+                ...CONFIGS,
+                'cpa.validacao.opcao1.ggr_minimo': { value: '20', data_type: 'float' },
+                'cpa.validacao.deteccao_fraude_ativa': { value: 'true', data_type: 'bool' }
+            }));
+            const mixed = [
+                ...leads,
+                lead({ userId: 'low-ggr', ggrAmount: 5 }),
+                lead({ userId: 'fraud', depositAmount: 2000, betCount: 3, ggrAmount: 100 })
+            ];
+
+            const { results } = await engine.validateBatch(mixed, 'opcao1');
+            for (let i = 0; i < mixed.length; i++) {
+                expect(results[i].result).toBe((await engine.validateCPA(mixed[i])).result);
+            }
+        });
+    });
+
+    describe('serializeBatchResults', () => {
+        test.each([false, true])('should match JSON.stringify of the results (verbose %p)', async (verbose) => {
+            const engine = createEngine(createConfigServiceStub(CONFIGS));
+            const leads = [
+                lead({ userId: 'approved' }),
+                lead({ userId: 'rejected', depositAmount: 10 }),
+                lead({ userId: 'several', depositAmount: 10, betCount: 2 }),
+                lead({ userId: 'repeated', depositAmount: 10, betCount: 2 }),
+                lead({ userId: undefined }),
+                lead({ affiliateId: undefined, depositAmount: 10 }),
+                lead({ affiliateId: 7, userId: 'aspas "e" \\ barras' })
+            ];
+
+            const { results } = await engine.validateBatch(leads, 'opcao1', { verbose });
+            expect(`[${CPARulesEngine.serializeBatchResults(results, 0, results.length)}]`).toBe(JSON.stringify(results));
+            expect(`[${CPARulesEngine.serializeBatchResults(results, 2, 5)}]`).toBe(JSON.stringify(results.slice(2, 5)));
+        });
+    });
+
+    describe('bulk configuration fallback', () => {
+        const expected = {
+            'cpa.validacao.opcao1.deposito_minimo': 30,
+            'cpa.validacao.opcao1.numero_apostas': 10,
+            'cpa.validacao.opcao1.ggr_minimo': null,
+            'cpa.validacao.prazo_dias': 30,
+            'cpa.validacao.timezone': null,
+            'cpa.validacao.deteccao_fraude_ativa': false
+        };
+
+        test.each([404, 405, 501])('should use individual fetches when bulk returns %i', async (status) => {
+            const stub = createConfigServiceStub(CONFIGS, () => Promise.reject(httpError(status)));
+            const engine = createEngine(stub);
+
+            expect(await engine.getRuleConfigs('opcao1')).toEqual(expected);
+            expect(stub.calls.get).toHaveLength(6);
+
+            // O endpoint em lote não é tentado de novo até o TTL do cache
+            engine.cache.clear();
+            await engine.getRuleConfigs('opcao1');
+            expect(stub.calls.post).toHaveLength(1);
+        });
+
+        test('should use individual fetches when bulk fails with 5xx', async () => {
+            const stub = createConfigServiceStub(CONFIGS, () => Promise.reject(httpError(503)));
+            const engine = createEngine(stub);
+
+            expect(await engine.getRuleConfigs('opcao1')).toEqual(expected);
+
+            // Falha transitória: a próxima carga tenta o lote novamente
+            engine.cache.clear();
+            await engine.getRuleConfigs('opcao1');
+            expect(stub.calls.post).toHaveLength(2);
+        });
+
+        test.each([
+            ['success false', { success: false }],
+            ['non-array data', { success: true, data: {} }],
+            ['empty body', '']
+        ])('should use individual fetches when bulk answers with %s', async (_, data) => {
+            const stub = createConfigServiceStub(CONFIGS, () => Promise.resolve({ status: 200, headers: {}, data }));
+            const engine = createEngine(stub);
+
+            expect(await engine.getRuleConfigs('opcao1')).toEqual(expected);
+            expect(stub.calls.get).toHaveLength(6);
+        });
+
+        test('should use the bulk response when available', async () => {
+            const stub = createConfigServiceStub({}, ({ keys }) => Promise.resolve({
+                status: 200,
+                headers: {},
+                data: {
+                    success: true,
+                    data: keys.filter(key => CONFIGS[key]).map(key => ({ key, ...CONFIGS[key] }))
+                }
+            }));
+            const engine = createEngine(stub);
+
+            expect(await engine.getRuleConfigs('opcao1')).toEqual(expected);
+            expect(stub.calls.get).toHaveLength(0);
+        });
+
+        test('should drop only the bulk entries whose value cannot be converted', async () => {
+            const stub = createConfigServiceStub({}, () => Promise.resolve({
+                status: 200,
+                headers: {},
+                data: {
+                    success: true,
+                    data: [
+                        ...Object.entries(CONFIGS).map(([key, config]) => ({ key, ...config })),
+                        { key: 'cpa.validacao.timezone', value: '{bad', data_type: 'json' },
+                        { key: 'cpa.validacao.opcao1.ggr_minimo', value: 20, data_type: 'bool' }
+                    ]
+                }
+            }));
+            const engine = createEngine(stub);
+
+            expect(await engine.getRuleConfigs('opcao1')).toEqual(expected);
+            expect((await engine.validateCPA(lead({ depositAmount: 10 }))).result).toBe('rejected');
+            expect((await engine.validateBatch([lead()], 'opcao1')).summary.approved).toBe(1);
+        });
+
+        test('should reject leads below the configured limits when bulk is unavailable', async () => {
+            const engine = createEngine(createConfigServiceStub(CONFIGS, () => Promise.reject(httpError(405))));
+
+            const response = await engine.validateCPA(lead({ depositAmount: 10 }));
+            expect(response.result).toBe('rejected');
+        });
+    });
+
+    describe('validation cache', () => {
+        test('should not serve results computed with a previous configuration', async () => {
+            const engine = createEngine(createConfigServiceStub(CONFIGS));
+            engine.redisClient = createRedisStub();
+
+            const first = await engine.validateCPA(lead({ depositAmount: 50 }));
+            expect(first.result).toBe('approved');
+            await engine.flushValidationCache();
+
+            const repeated = await engine.validateCPA(lead({ depositAmount: 50 }));
+            expect(repeated.cached).toBe(true);
+
+            // Depósito mínimo alterado no config-service e recarregado
+            await engine.storeConfigurations([['cpa.validacao.opcao1.deposito_minimo', 100]]);
+
+            const afterChange = await engine.validateCPA(lead({ depositAmount: 50 }));
+            expect(afterChange.result).toBe('rejected');
+            expect(afterChange.cached).toBeUndefined();
+            expect(afterChange.details.configsUsed['cpa.validacao.opcao1.deposito_minimo']).toBe(100);
+        });
+
+        test('should not memoize a stale result under the version of a background refresh', async () => {
+            const configs = { ...CONFIGS };
+            const engine = createEngine(createConfigServiceStub(configs));
+            const redis = createRedisStub();
+            engine.redisClient = redis;
+            await engine.validateCPA(lead());
+
+            // Configurações vencidas no cache local e alteradas no config-service
+            for (const entry of engine.cache.values()) {
+                entry.timestamp -= engine.cacheTTL + 1;
+            }
+            redis.store.clear();
+            configs['cpa.validacao.opcao1.deposito_minimo'] = { value: '100', data_type: 'float' };
+
+            // A atualização em segundo plano termina enquanto o Redis responde
+            const get = redis.get;
+            redis.get = async (key) => {
+                await new Promise(resolve => setTimeout(resolve, 20));
+                return get(key);
+            };
+
+            const stale = await engine.validateCPA(lead({ userId: 'user2', depositAmount: 50 }));
+            expect(stale.details.configsUsed['cpa.validacao.opcao1.deposito_minimo']).toBe(30);
+
+            const fresh = await engine.validateCPA(lead({ userId: 'user2', depositAmount: 50 }));
+            expect(fresh.result).toBe('rejected');
+            expect(fresh.cached).toBeUndefined();
+        });
+
+        test('should share Redis results between engines with the same configuration', async () => {
+            const redis = createRedisStub();
+            const first = createEngine(createConfigServiceStub(CONFIGS));
+            first.redisClient = redis;
+            await first.validateCPA(lead());
+            await first.flushValidationCache();
+
+            const second = createEngine(createConfigServiceStub(CONFIGS));
+            second.redisClient = redis;
+            const response = await second.validateCPA(lead());
+            expect(response.cached).toBe(true);
+        });
+    });
+
+    describe('config-service circuit breaker', () => {
+        const timeoutError = () => Object.assign(new Error('timeout of 5000ms exceeded'), { code: 'ECONNABORTED' });
+
+        // Cliente HTTP real do engine (axios e interceptors) com um adapter que
+        // responde sem rede: erros são rejeitados, demais valores viram o corpo
+        function createClient(respond) {
+            const client = createEngine().httpClient;
+            client.calls = 0;
+            client.defaults.adapter = async (config) => {
+                client.calls++;
+                const outcome = await respond(config);
+                if (outcome instanceof Error) {
+                    outcome.config = config;
+                    throw outcome;
+                }
+                return { status: 200, statusText: 'OK', headers: {}, config, data: outcome };
+            };
+            return client;
+        }
+
+        async function openBreaker(client) {
+            for (let i = 0; i < 5; i++) {
+                await expect(client.get('/health')).rejects.toMatchObject({ response: { status: 500 } });
+            }
+        }
+
+        async function errorCount(type) {
+            const { values } = await promClient.register.getSingleMetric('config_service_errors_total').get();
+            const entry = values.find(v => v.labels.endpoint === 'health' && v.labels.type === type);
+            return entry ? entry.value : 0;
+        }
+
+        afterEach(() => {
+            jest.restoreAllMocks();
+        });
+
+        test.each([
+            ['5xx', () => httpError(500)],
+            ['timeout', timeoutError]
+        ])('should open after consecutive %s failures and fail fast', async (type, failure) => {
+            const client = createClient(failure);
+            for (let i = 0; i < 5; i++) {
+                await expect(client.get('/health')).rejects.toMatchObject({ message: failure().message });
+            }
+
+            const circuitOpen = await errorCount('circuit_open');
+            await expect(client.get('/health')).rejects.toMatchObject({ code: 'ECIRCUITOPEN' });
+            expect(client.calls).toBe(5);
+            expect(await errorCount('circuit_open')).toBe(circuitOpen + 1);
+        });
+
+        test('should not count 4xx responses as failures', async () => {
+            let status = 500;
+            const client = createClient(() => httpError(status));
+            for (const next of [500, 500, 500, 500, 404, 500, 500, 500, 500]) {
+                status = next;
+                await expect(client.get('/health')).rejects.toMatchObject({ response: { status } });
+            }
+
+            status = 404;
+            await expect(client.get('/health')).rejects.toMatchObject({ response: { status: 404 } });
+            expect(client.calls).toBe(10);
+        });
+
+        test('should let a single probe through after the reset interval', async () => {
+            let respond = () => httpError(500);
+            const client = createClient(() => respond());
+            await openBreaker(client);
+
+            let release;
+            const pending = new Promise(resolve => { release = resolve; });
+            respond = () => pending;
+            jest.spyOn(Date, 'now').mockReturnValue(Date.now() + 30001);
+
+            const probe = client.get('/health');
+            await expect(client.get('/health')).rejects.toMatchObject({ code: 'ECIRCUITOPEN' });
+
+            release({ status: 'ok' });
+            expect((await probe).status).toBe(200);
+
+            // Sonda bem-sucedida fecha o circuito
+            respond = () => ({ status: 'ok' });
+            expect((await client.get('/health')).status).toBe(200);
+            expect(client.calls).toBe(7);
+        });
+
+        test('should reopen when the probe fails', async () => {
+            const client = createClient(() => httpError(500));
+            await openBreaker(client);
+
+            jest.spyOn(Date, 'now').mockReturnValue(Date.now() + 30001);
+            await expect(client.get('/health')).rejects.toMatchObject({ response: { status: 500 } });
+            await expect(client.get('/health')).rejects.toMatchObject({ code: 'ECIRCUITOPEN' });
+            expect(client.calls).toBe(6);
+        });
+    });
+});
@@ -0,0 +1,53 @@
+const {
+    RULE_DEPOSIT,
+    RULE_BETS,
+    RULE_GGR,
+    RULE_PERIOD,
+    RULE_FRAUD,
+    DAY_MS,
+    periodCutoff,
+    newAccountCutoff,
+    evaluateLead,
+    evaluateBatch
+} = require('../src/cpa-kernel');
+
+describe('cpa-kernel', () => {
+    const now = Date.now();
+    const registeredAfter = periodCutoff(now, 30);
+    const newAccountAfter = newAccountCutoff(now);
+
+    test('evaluateLead should approve a lead meeting every rule', () => {
+        expect(evaluateLead(100, 20, 50, now - 5 * DAY_MS, 30, 10, 20, registeredAfter, newAccountAfter, true)).toBe(0);
+    });
+
+    test('evaluateLead should flag each failed rule', () => {
+        expect(evaluateLead(10, 5, 5, now - 40 * DAY_MS, 30, 10, 20, registeredAfter, newAccountAfter, false))
+            .toBe(RULE_DEPOSIT | RULE_BETS | RULE_GGR | RULE_PERIOD);
+        expect(evaluateLead(2000, 3, 100, now - DAY_MS, 30, 1, 20, registeredAfter, newAccountAfter, true)).toBe(RULE_FRAUD);
+    });
+
+    test('evaluateLead should skip rules with infinite limits', () => {
+        expect(evaluateLead(0, 0, -100, now - 365 * DAY_MS, -Infinity, -Infinity, -Infinity, periodCutoff(now, Infinity), newAccountAfter, false)).toBe(0);
+    });
+
+    test('periodCutoff should match whole elapsed days', () => {
+        // 30 dias e 23h ainda contam como 30 dias completos
+        expect(now - (30 * DAY_MS + 23 * 60 * 60 * 1000) > periodCutoff(now, 30)).toBe(true);
+        expect(now - 31 * DAY_MS > periodCutoff(now, 30)).toBe(false);
+    });
+
+    test('evaluateBatch should fill one mask per lead', () => {
+        const day = DAY_MS;
+        const batch = {
+            size: 2,
+            deposits: Float64Array.of(100, 10),
+            bets: Float64Array.of(20, 20),
+            ggr: Float64Array.of(50, 50),
+            registrationTimes: Float64Array.of(now - 5 * day, now - 40 * day)
+        };
+        const limits = { depositLimit: 30, betsLimit: 10, ggrLimit: 20, daysLimit: 30, checkFraud: false };
+
+        const failed = evaluateBatch(batch, limits, now, new Uint8Array(2));
+        expect(Array.from(failed)).toEqual([0, RULE_DEPOSIT | RULE_PERIOD]);
+    });
+});
@@ -1,6 +1,17 @@
 const request = require('supertest');
+const { encode } = require('@msgpack/msgpack');
+const CPARulesEngine = require('../src/cpa-engine');
 const app = require('../src/server');
 
+const lead = {
+    affiliateId: 'aff1',
+    userId: 'user1',
+    depositAmount: 100,
+    betCount: 20,
+    ggrAmount: 50,
+    registrationDate: new Date().toISOString()
+};
+
 describe('integration-service', () => {
     test('GET /health should return 200', async () => {
         const response = await request(app).get('/health');
@@ -20,4 +31,63 @@ describe('integration-service', () => {
         expect(response.status).toBe(200);
         expect(response.body.service).toBe('integration-service');
     });
+
+    test('POST /api/v1/integration-service/validate-cpa-batch should reject empty batch', async () => {
+        const response = await request(app)
+            .post('/api/v1/integration-service/validate-cpa-batch')
+            .send({ leads: [] });
+        expect(response.status).toBe(400);
+        expect(response.body.status).toBe('error');
+    });
+
+    test.each([NaN, Infinity, -Infinity])('POST /api/v1/integration-service/validate-cpa should reject MessagePack amount %p', async (amount) => {
+        const response = await request(app)
+            .post('/api/v1/integration-service/validate-cpa')
+            .set('Content-Type', 'application/msgpack')
+            .send(Buffer.from(encode({ ...lead, ggrAmount: amount })));
+        expect(response.status).toBe(400);
+        expect(response.body.status).toBe('error');
+    });
+
+    test('POST /api/v1/integration-service/validate-cpa-batch should reject non-finite MessagePack amounts', async () => {
+        const response = await request(app)
+            .post('/api/v1/integration-service/validate-cpa-batch')
+            .set('Content-Type', 'application/msgpack')
+            .send(Buffer.from(encode({ leads: [{ ...lead, depositAmount: Infinity }, { ...lead, betCount: NaN }] })));
+        expect(response.status).toBe(400);
+        expect(response.body.errors.map(error => error.index)).toEqual([0, 1]);
+    });
+
+    test('POST /api/v1/integration-service/validate-cpa-batch should stream a large compressed batch', async () => {
+        jest.spyOn(CPARulesEngine.prototype, 'getRuleConfigs').mockResolvedValue({
+            'cpa.validacao.opcao1.deposito_minimo': 30,
+            'cpa.validacao.opcao1.numero_apostas': 10,
+            'cpa.validacao.opcao1.ggr_minimo': null,
+            'cpa.validacao.prazo_dias': 30,
+            'cpa.validacao.timezone': null,
+            'cpa.validacao.deteccao_fraude_ativa': false
+        });
+        const warnings = [];
+        const onWarning = warning => warnings.push(warning.name);
+        process.on('warning', onWarning);
+
+        try {
+            // 6000 leads = 12 trechos de 500 resultados, cada um maior que o buffer do gzip
+            const leads = Array.from({ length: 6000 }, (_, index) => ({ ...lead, userId: `user${index}` }));
+            const response = await request(app)
+                .post('/api/v1/integration-service/validate-cpa-batch')
+                .set('Accept-Encoding', 'gzip')
+                .send({ leads });
+            await new Promise(resolve => setImmediate(resolve));
+
+            expect(response.status).toBe(200);
+            expect(response.headers['content-encoding']).toBe('gzip');
+            expect(response.body.data.results).toHaveLength(6000);
+            expect(response.body.data.summary.approved).toBe(6000);
+            expect(warnings).not.toContain('MaxListenersExceededWarning');
+        } finally {
+            process.off('warning', onWarning);
+            jest.restoreAllMocks();
+        }
+    });
 });